@@ -0,0 +1,296 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import chain
+from kaizen_schema import states_document, tasks_document
+from kaizen_storage import JsonStorage, TaskList, save_json, tasks_to_json, write_atomic
+
+# Layout of a .kzb file (all integers little-endian):
+#
+#   header      magic, version, string count, tab count, section offsets, CRC-32 of everything after it
+#   strings     (count + 1) u32 byte offsets into the blob, then the UTF-8 blob; every tab name,
+#               task id, task text and completion date is stored once and referred to by index
+#   directory   per tab: name, flags, task count, state count, offsets of its arrays
+#   per tab     task id indices (u32 x tasks), task text indices (u32 x tasks),
+#               state task id indices and date indices (u32 x states each), completion bits
+#   meta        free-form JSON (the stamps of the JSON files the snapshot was made from)
+#
+# Reading maps the file, checks it, then decodes the string blob in one pass
+# and each tab's arrays straight into TaskLists and state dicts.
+MAGIC = b"KZNB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQQQQI")
+DIRECTORY_ENTRY = struct.Struct("<IIIIQQQQQ")
+NO_STRING = 0xFFFFFFFF
+TAB_HAS_TASKS = 1  # Unset for tabs that only have leftover task states
+# Completion flags of the eight rows packed into each byte value, lowest bit first
+BIT_TABLE = [tuple(bool(value >> bit & 1) for bit in range(8)) for value in range(256)]
+
+class BinaryFormatError(ValueError):
+    pass
+
+def _u32_array(values):
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+def _read_u32_array(buffer, offset, count):
+    arr = array("I")
+    arr.frombytes(buffer[offset:offset + 4 * count])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+def _pack_bits(flags):
+    bits = bytearray((len(flags) + 7) // 8)
+    for idx, flag in enumerate(flags):
+        if flag:
+            bits[idx >> 3] |= 1 << (idx & 7)
+    return bytes(bits)
+
+def encode_snapshot(tasks, task_states, meta=None):
+    """Serialize {tab: TaskList} and {tab: {task_id: state}} to the binary layout.
+
+    Raises BinaryFormatError for states the format cannot hold (keys other
+    than completed/date_completed), so callers can keep JSON for those.
+    """
+    strings = []
+    index = {}
+
+    def intern(text):
+        if text is None:
+            return NO_STRING
+        idx = index.get(text)
+        if idx is None:
+            idx = index[text] = len(strings)
+            strings.append(text)
+        return idx
+
+    tab_names = list(tasks) + [tab_name for tab_name in task_states if tab_name not in tasks]
+    tabs = []
+    for tab_name in tab_names:
+        task_list = tasks.get(tab_name)
+        items = list(task_list.items()) if task_list is not None else []
+        tab_states = task_states.get(tab_name, {})
+        for state in tab_states.values():
+            if not set(state) <= {"completed", "date_completed"} or not isinstance(state.get("completed"), bool):
+                raise BinaryFormatError(f"Task state in {tab_name!r} has no binary representation: {state!r}")
+        tabs.append((
+            intern(tab_name),
+            TAB_HAS_TASKS if task_list is not None else 0,
+            _u32_array(intern(task_id) for task_id, _ in items),
+            _u32_array(intern(text) for _, text in items),
+            _u32_array(intern(task_id) for task_id in tab_states),
+            _u32_array(intern(state.get("date_completed")) for state in tab_states.values()),
+            _pack_bits([state["completed"] for state in tab_states.values()]),
+            len(items),
+            len(tab_states),
+        ))
+
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    body = bytearray()
+    offsets_pos = HEADER.size
+    body += _u32_array(offsets)
+    blob_pos = HEADER.size + len(body)
+    body += b"".join(encoded)
+    directory_pos = HEADER.size + len(body)
+    data_pos = directory_pos + DIRECTORY_ENTRY.size * len(tabs)
+    entries = bytearray()
+    sections = bytearray()
+    for name_idx, flags, ids, texts, state_ids, dates, bits, task_count, state_count in tabs:
+        ids_pos = data_pos + len(sections)
+        texts_pos = ids_pos + len(ids)
+        state_ids_pos = texts_pos + len(texts)
+        dates_pos = state_ids_pos + len(state_ids)
+        bits_pos = dates_pos + len(dates)
+        entries += DIRECTORY_ENTRY.pack(name_idx, flags, task_count, state_count,
+                                        ids_pos, texts_pos, state_ids_pos, dates_pos, bits_pos)
+        sections += ids + texts + state_ids + dates + bits
+    body += entries + sections
+    meta_pos = HEADER.size + len(body)
+    meta_bytes = json.dumps(meta or {}).encode("utf-8")
+    body += meta_bytes
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(strings), len(tabs),
+                         offsets_pos, blob_pos, directory_pos, meta_pos, len(meta_bytes), zlib.crc32(body))
+    return header + bytes(body)
+
+def write_snapshot(path, tasks, task_states, meta=None):
+    """Atomically replace path with a binary snapshot of the stores"""
+    write_atomic(path, encode_snapshot(tasks, task_states, meta))
+
+class BinarySnapshot:
+    """Read-only, memory-mapped view of a .kzb file.
+
+    Opening checks the header and checksum and reads the tab directory;
+    load_all() decodes the stores.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            self._file.close()
+            raise BinaryFormatError(f"{path} is empty")
+        try:
+            self._read_header(path)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self, path):
+        if len(self._map) < HEADER.size:
+            raise BinaryFormatError(f"{path} is truncated")
+        (magic, version, _, self._string_count, tab_count, offsets_pos, self._blob_pos,
+         directory_pos, meta_pos, meta_len, crc) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise BinaryFormatError(f"{path} is not a kaizen snapshot")
+        if version != VERSION:
+            raise BinaryFormatError(f"{path} has unsupported version {version}")
+        if zlib.crc32(memoryview(self._map)[HEADER.size:]) != crc:
+            raise BinaryFormatError(f"{path} fails its checksum")
+        self._offsets = _read_u32_array(self._map, offsets_pos, self._string_count + 1)
+        self.meta = json.loads(self._map[meta_pos:meta_pos + meta_len].decode("utf-8"))
+        self._directory = {}
+        for idx in range(tab_count):
+            entry = DIRECTORY_ENTRY.unpack_from(self._map, directory_pos + idx * DIRECTORY_ENTRY.size)
+            self._directory[self._string(entry[0])] = entry[1:]
+
+    def _string(self, idx):
+        start = self._blob_pos + self._offsets[idx]
+        return self._map[start:self._blob_pos + self._offsets[idx + 1]].decode("utf-8")
+
+    def _tab(self, tab_name, strings):
+        """(TaskList or None, {task_id: state}) for one tab, given every decoded string"""
+        flags, task_count, state_count, ids_pos, texts_pos, state_ids_pos, dates_pos, bits_pos = \
+            self._directory[tab_name]
+
+        def strings_at(pos, count):
+            return [strings[idx] if idx != NO_STRING else None for idx in _read_u32_array(self._map, pos, count)]
+
+        task_list = None
+        if flags & TAB_HAS_TASKS:
+            task_list = TaskList.from_columns(strings_at(ids_pos, task_count), strings_at(texts_pos, task_count))
+        state_ids = strings_at(state_ids_pos, state_count)
+        dates = strings_at(dates_pos, state_count)
+        bits = self._map[bits_pos:bits_pos + (state_count + 7) // 8]
+        completed = list(chain.from_iterable(map(BIT_TABLE.__getitem__, bits)))
+        tab_states = {task_id: {"completed": done, "date_completed": date}
+                      for task_id, done, date in zip(state_ids, completed, dates)}
+        return task_list, tab_states
+
+    def load_all(self):
+        """Decode every tab into ({tab: TaskList}, {tab: {task_id: state}})"""
+        # Decoding the whole blob in one pass beats looking strings up one at a time
+        blob = self._map[self._blob_pos:self._blob_pos + self._offsets[-1]]
+        offsets = self._offsets
+        strings = [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        tasks, task_states = {}, {}
+        for tab_name in self._directory:
+            task_list, tab_states = self._tab(tab_name, strings)
+            if task_list is not None:
+                tasks[tab_name] = task_list
+            if tab_states:
+                task_states[tab_name] = tab_states
+        return tasks, task_states
+
+    def close(self):
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def file_stamp(path):
+    """(size, mtime_ns) of path, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+class BinaryCachedStorage(JsonStorage):
+    """JsonStorage that keeps a binary copy of tasks and task states next to the JSON files.
+
+    The JSON files stay the source of truth and are written exactly as
+    before. Each full save also writes the .kzb file, stamped with the size
+    and mtime of the JSON files it mirrors; on load it is used instead of
+    parsing JSON whenever those stamps still match, so editing or replacing
+    tasks.json by hand simply falls back to the JSON path.
+    """
+
+    def __init__(self, tasks_file, states_file, settings_file, journal_file, binary_file):
+        super().__init__(tasks_file, states_file, settings_file, journal_file)
+        self.binary_file = binary_file
+
+    def _stamps(self):
+        return {"tasks": file_stamp(self.tasks_file), "states": file_stamp(self.states_file)}
+
+    def load_stores(self, default_tasks):
+        try:
+            with BinarySnapshot(self.binary_file) as snapshot:
+                if snapshot.meta.get("stamps") == self._stamps():
+                    return snapshot.load_all()
+        except (OSError, BinaryFormatError):
+            pass
+        tasks, task_states = super().load_stores(default_tasks)
+        if os.path.exists(self.tasks_file):
+            self.save_binary(tasks, task_states)
+        return tasks, task_states
+
+    def save_all(self, tasks, task_states):
+        super().save_all(tasks, task_states)
+        self.save_binary(tasks, task_states)
+
+    def save_binary(self, tasks, task_states):
+        try:
+            write_snapshot(self.binary_file, tasks, task_states, {"stamps": self._stamps()})
+        except BinaryFormatError:
+            # Stores the format can't hold are only kept as JSON
+            try:
+                os.remove(self.binary_file)
+            except FileNotFoundError:
+                pass
+
+def json_to_binary(data_dir):
+    """Write tasks.kzb from the tasks.json and task_states.json in data_dir"""
+    storage = BinaryCachedStorage(os.path.join(data_dir, "tasks.json"), os.path.join(data_dir, "task_states.json"),
+                                  os.path.join(data_dir, "settings.json"), os.path.join(data_dir, "tasks.journal"),
+                                  os.path.join(data_dir, "tasks.kzb"))
+    tasks, task_states, _ = storage.load({}, {})
+    storage.journal.close()
+    # Stamped like the app's own copy, so the next start loads it instead of the JSON
+    storage.save_binary(tasks, task_states)
+    return tasks, task_states
+
+def binary_to_json(data_dir):
+    """Rewrite tasks.json and task_states.json in data_dir from its tasks.kzb"""
+    with BinarySnapshot(os.path.join(data_dir, "tasks.kzb")) as snapshot:
+        tasks, task_states = snapshot.load_all()
+    save_json(os.path.join(data_dir, "tasks.json"), tasks_document(tasks_to_json(tasks)))
+    save_json(os.path.join(data_dir, "task_states.json"), states_document(task_states))
+    return tasks, task_states
+
+if __name__ == "__main__":
+    # python kaizen_binary.py to-binary|to-json [data_dir]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("to-binary", "to-json"):
+        sys.exit("usage: python kaizen_binary.py to-binary|to-json [data_dir]")
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else "."
+    convert = json_to_binary if sys.argv[1] == "to-binary" else binary_to_json
+    tasks, task_states = convert(data_dir)
+    print(f"Converted {len(tasks)} tabs and {sum(len(t) for t in tasks.values())} tasks")
@@ -0,0 +1,256 @@
+"""kaizen: batch operations on a Kaizen task store, without the GUI.
+
+    python kaizen_cli.py add Work "Write report" "Email Bob"
+    python kaizen_cli.py add Work < tasks.txt            (one task per line)
+    python kaizen_cli.py toggle Work --done "Write report"
+    python kaizen_cli.py delete Work --file old.txt
+    python kaizen_cli.py move Work --to Someday "Learn Rust"
+    python kaizen_cli.py reset Weekly                    (no tab: every tab)
+    python kaizen_cli.py reset --kind daily              (run a scheduled reset now)
+    python kaizen_cli.py reset --due                     (run the resets that are due, e.g. from cron)
+    python kaizen_cli.py rule Gym "weekly mon,wed,fri 06:00"
+    python kaizen_cli.py import big.jsonl
+    python kaizen_cli.py query --tab Work --undone --contains report
+    python kaizen_cli.py query --search "email bo"
+    python kaizen_cli.py export --format csv -o tasks.csv
+    python kaizen_cli.py stats --tab Dailies --by week
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+from kaizen_core import KaizenStore
+from kaizen_history import summary_lines
+from kaizen_import import StreamingImporter
+from kaizen_scheduler import RESET_KINDS
+from kaizen_schema import tasks_document
+
+def read_texts(args):
+    """Task texts from the command line, else from --file, else from stdin"""
+    if args.tasks:
+        return args.tasks
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f if line.strip()]
+    return [line.rstrip("\n") for line in sys.stdin if line.strip()]
+
+def ids_for(store, tab_name, texts):
+    """Ids of the given task texts in a tab; unknown texts are reported and skipped"""
+    task_list = store.tasks.get(tab_name)
+    if task_list is None:
+        sys.exit(f"kaizen: no tab named {tab_name!r}")
+    ids = []
+    for text in texts:
+        task_id = task_list.id_of(text.strip())
+        if task_id is None:
+            print(f"kaizen: no task {text.strip()!r} in {tab_name!r}", file=sys.stderr)
+        else:
+            ids.append(task_id)
+    return ids
+
+def cmd_tabs(store, args):
+    for tab_name in store.tab_names():
+        tab_states = store.task_states.get(tab_name, {})
+        done = sum(1 for state in tab_states.values() if state["completed"])
+        print(f"{tab_name}\t{len(store.tasks[tab_name])} tasks\t{done} done")
+
+def cmd_add(store, args):
+    added = store.add_tasks(args.tab, read_texts(args))
+    print(f"Added {len(added)} tasks to {args.tab}")
+
+def cmd_delete(store, args):
+    deleted = store.delete_tasks(args.tab, ids_for(store, args.tab, read_texts(args)))
+    print(f"Deleted {deleted} tasks from {args.tab}")
+
+def cmd_toggle(store, args):
+    ids = ids_for(store, args.tab, read_texts(args))
+    if args.done or args.undone:
+        changed = store.set_completed(args.tab, ids, args.done)
+    else:
+        changed = store.toggle_tasks(args.tab, ids)
+    print(f"Changed {changed} tasks in {args.tab}")
+
+def cmd_move(store, args):
+    moved = store.move_tasks(args.tab, ids_for(store, args.tab, read_texts(args)), args.to)
+    print(f"Moved {moved} tasks from {args.tab} to {args.to}")
+
+def cmd_reset(store, args):
+    if args.due:
+        changed = store.reset_scheduler().run_due(datetime.now())
+        print(f"Ran the resets due on: {', '.join(changed) or 'no tabs'}")
+    elif args.kind:
+        changed = store.run_reset(args.kind, datetime.now())
+        print(f"Ran the {args.kind} reset on: {', '.join(changed) or 'no tabs'}")
+    elif args.tabs:
+        for tab_name in args.tabs:
+            store.reset_tab(tab_name)
+        print(f"Reset {len(args.tabs)} tabs")
+    else:
+        store.reset_all()
+        print("Reset all tabs")
+
+def cmd_rule(store, args):
+    if args.tab is None:
+        for tab_name in store.tab_names():
+            rule = store.reset_rule(tab_name)
+            next_reset = store.next_reset(tab_name)
+            print(f"{tab_name}\t{rule if rule is not None else 'never'}"
+                  + (f"\tnext {next_reset:%Y-%m-%d %H:%M}" if next_reset else ""))
+        return
+    try:
+        store.set_reset_rule(args.tab, " ".join(args.rule))
+    except ValueError as e:
+        sys.exit(f"kaizen: {e}")
+    print(f"{args.tab} resets: {store.reset_rule(args.tab) or 'never'}")
+
+def cmd_import(store, args):
+    def apply_batch(records, report):
+        store.merge_import(records, report)
+
+    for path in args.files:
+        report = StreamingImporter(path, apply_batch).run()
+        print(f"{path}: {report.summary()}")
+
+def matching_rows(store, args):
+    """(tab, task_id, text, completed) for every task matching the query options"""
+    tab_names = [args.tab] if args.tab else store.tab_names()
+    contains = args.contains.lower() if getattr(args, "contains", None) else None
+    search = getattr(args, "search", None)
+    for tab_name in tab_names:
+        if search:
+            rows = store.task_rows(tab_name, [task_id for _, task_id in store.search(search, tab_name)])
+        else:
+            rows = store.rows(tab_name)
+        for task_id, text, completed in rows:
+            if getattr(args, "done", False) and not completed:
+                continue
+            if getattr(args, "undone", False) and completed:
+                continue
+            if contains is not None and contains not in text.lower():
+                continue
+            yield tab_name, task_id, text, completed
+
+def write_rows(rows, store, fmt, out):
+    if fmt == "text":
+        for tab_name, _, text, completed in rows:
+            out.write(f"{tab_name}\t{'x' if completed else ' '}\t{text}\n")
+    elif fmt == "jsonl":
+        for tab_name, task_id, text, completed in rows:
+            state = store.task_states.get(tab_name, {}).get(task_id) or {}
+            out.write(json.dumps({"tab": tab_name, "id": task_id, "task": text, "completed": completed,
+                                  "date_completed": state.get("date_completed")}) + "\n")
+    elif fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["tab", "id", "task", "completed", "date_completed"])
+        for tab_name, task_id, text, completed in rows:
+            state = store.task_states.get(tab_name, {}).get(task_id) or {}
+            writer.writerow([tab_name, task_id, text, "true" if completed else "false",
+                             state.get("date_completed") or ""])
+    else:
+        # The same layout as tasks.json, so the output can be imported or used as a store
+        tabs = {}
+        for tab_name, task_id, text, _ in rows:
+            tabs.setdefault(tab_name, []).append({"id": task_id, "text": text})
+        json.dump(tasks_document(tabs), out, indent=4)
+        out.write("\n")
+
+def cmd_query(store, args):
+    rows = matching_rows(store, args)
+    if args.count:
+        print(sum(1 for _ in rows))
+    else:
+        write_rows(rows, store, args.format, sys.stdout)
+
+def cmd_export(store, args):
+    rows = matching_rows(store, args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            write_rows(rows, store, args.format, out)
+    else:
+        write_rows(rows, store, args.format, sys.stdout)
+
+def cmd_stats(store, args):
+    stats = store.stats()
+    if args.by:
+        for label, count in stats.rollup(args.tab, args.by):
+            print(f"{label}\t{count}")
+        return
+    for tab_name in [args.tab] if args.tab else store.tab_names():
+        print("\n".join(summary_lines(stats, tab_name, len(store.tasks.get(tab_name, ())))))
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="kaizen", description="Batch operations on a Kaizen task store")
+    parser.add_argument("-d", "--data-dir", default=".", help="folder holding the store (default: current)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("tabs", help="list tabs with task counts").set_defaults(run=cmd_tabs)
+
+    for name, run, help_text in (("add", cmd_add, "add tasks to a tab, creating it if needed"),
+                                 ("delete", cmd_delete, "delete tasks from a tab"),
+                                 ("toggle", cmd_toggle, "flip (or set) task completion"),
+                                 ("move", cmd_move, "move tasks to another tab, creating it if needed")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("tab")
+        command.add_argument("tasks", nargs="*", help="task texts (default: --file, else stdin)")
+        command.add_argument("-f", "--file", help="read task texts from this file, one per line")
+        if name == "move":
+            command.add_argument("--to", required=True, help="the tab to move them to")
+        if name == "toggle":
+            flags = command.add_mutually_exclusive_group()
+            flags.add_argument("--done", action="store_true", help="mark done instead of toggling")
+            flags.add_argument("--undone", action="store_true", help="mark not done instead of toggling")
+        command.set_defaults(run=run)
+
+    reset = commands.add_parser("reset", help="mark tasks not done")
+    reset.add_argument("tabs", nargs="*", help="tabs to reset (default: all)")
+    reset.add_argument("--kind", choices=RESET_KINDS, help="run the scheduled daily/weekly/monthly reset now")
+    reset.add_argument("--due", action="store_true", help="run every scheduled reset that is due")
+    reset.set_defaults(run=cmd_reset)
+
+    rule = commands.add_parser("rule", help="show reset rules, or set a tab's (no rule: back to the default)")
+    rule.add_argument("tab", nargs="?")
+    rule.add_argument("rule", nargs="*", help='e.g. "daily 06:30", "weekly mon,thu", "every 3 days", "month-end"')
+    rule.set_defaults(run=cmd_rule)
+
+    import_command = commands.add_parser("import", help="merge JSON, JSONL or CSV task files")
+    import_command.add_argument("files", nargs="+")
+    import_command.set_defaults(run=cmd_import)
+
+    for name, run, default_format in (("query", cmd_query, "text"), ("export", cmd_export, "json")):
+        command = commands.add_parser(name, help=f"{name} tasks")
+        command.add_argument("--tab", help="only this tab")
+        command.add_argument("--format", choices=("text", "json", "jsonl", "csv"), default=default_format)
+        if name == "query":
+            command.add_argument("--contains", help="only tasks whose text contains this (case-insensitive)")
+            command.add_argument("--search", help="only tasks with all these words (the last may be a prefix)")
+            flags = command.add_mutually_exclusive_group()
+            flags.add_argument("--done", action="store_true", help="only completed tasks")
+            flags.add_argument("--undone", action="store_true", help="only tasks not completed")
+            command.add_argument("--count", action="store_true", help="print the number of matches only")
+        else:
+            command.add_argument("-o", "--output", help="write here instead of stdout")
+        command.set_defaults(run=run)
+
+    stats = commands.add_parser("stats", help="completion rates, streaks and rollups from the history")
+    stats.add_argument("--tab", help="only this tab")
+    stats.add_argument("--by", choices=("week", "month"), help="completions per week or month instead")
+    stats.set_defaults(run=cmd_stats)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    # Task texts may also follow options, e.g. `toggle Work --done a b`
+    if extra and hasattr(args, "tasks") and not any(arg.startswith("-") for arg in extra):
+        args.tasks += extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    store = KaizenStore.open(args.data_dir)
+    try:
+        args.run(store, args)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
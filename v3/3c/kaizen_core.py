@@ -0,0 +1,632 @@
+import copy
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from kaizen_binary import BinaryCachedStorage
+from kaizen_history import CompletionLog, CompletionStats, completion_events
+from kaizen_scheduler import RecurrenceRule, ResetScheduler
+from kaizen_schema import upgrade_settings
+from kaizen_storage import apply_op, new_task_id, resolve_task_id, JsonStorage, SqliteStorage, PersistenceWriter, migrate_json_to_sqlite
+from kaizen_sync import ChangeWatcher, SharedBinaryStorage, SharedJsonStorage, replace_changed_tabs
+from kaizen_undo import TabPositions, UndoEntry, UndoHistory, compact_restores, inverse_ops
+
+TASKS_FILE = "tasks.json"
+SETTINGS_FILE = "settings.json"
+STATES_FILE = "task_states.json"
+JOURNAL_FILE = "tasks.journal"
+DB_FILE = "kaizen.db"
+BINARY_FILE = "tasks.kzb"
+
+DEFAULT_SETTINGS = {
+    "theme": "light",
+    "custom_color": "#ffffff",
+    "reset_hour": 0,  # Default reset at midnight (0:00)
+    "reset_minute": 0,
+    "window_width": 600,
+    "window_height": 400,
+    "tab_order": ["Dailies"],
+    "reset_rules": {},  # Tab -> its own reset rule (see RecurrenceRule), overriding default_reset_rule
+    "tab_resets": {},  # Tab -> ISO time of its last reset
+    "prefetch_tabs": True,  # Build unopened tabs in the background while idle
+    "save_delay_ms": 500,  # Changes within this window are written to disk together
+    "undo_depth": 100  # How many changes Undo can take back
+}
+
+# Settings an undo puts back along with the tasks. Not tab_resets: a
+# reset that was undone still ran, or it would run again on the next start
+UNDO_SETTINGS = ("tab_order", "reset_rules")
+
+# Default daily tasks
+DAILY_TASKS = ["Physical Win", "Mental Win", "Spiritual Win"]
+
+# Tabs that can't be deleted
+PROTECTED_TABS = {"Dailies"}
+
+def open_storage(data_dir="."):
+    """Storage backend for a data directory.
+
+    "json" keeps the classic JSON files (plus journal); "sqlite" keeps
+    everything in kaizen.db. An existing kaizen.db wins unless KAIZEN_STORAGE
+    says otherwise. With KAIZEN_BINARY=1 the JSON backend also keeps a compact
+    binary copy (tasks.kzb) that loads much faster than parsing the JSON; once
+    the file exists it stays in use unless KAIZEN_BINARY=0.
+
+    The JSON backend is safe to share between processes (see kaizen_sync);
+    SQLite does its own locking.
+    """
+    def path(name):
+        return os.path.join(data_dir, name)
+
+    backend = os.environ.get("KAIZEN_STORAGE", "sqlite" if os.path.exists(path(DB_FILE)) else "json")
+    use_binary = os.environ.get("KAIZEN_BINARY", "1" if os.path.exists(path(BINARY_FILE)) else "0") == "1"
+    json_files = (path(TASKS_FILE), path(STATES_FILE), path(SETTINGS_FILE), path(JOURNAL_FILE))
+    if backend != "sqlite":
+        if use_binary:
+            return SharedBinaryStorage(*json_files, path(BINARY_FILE))
+        return SharedJsonStorage(*json_files)
+    json_storage = BinaryCachedStorage(*json_files, path(BINARY_FILE)) if use_binary else JsonStorage(*json_files)
+    storage = SqliteStorage(path(DB_FILE))
+    if storage.is_empty():
+        # First run on SQLite: bring over whatever the JSON files hold
+        migrate_json_to_sqlite(json_storage, storage, {"Dailies": DAILY_TASKS}, DEFAULT_SETTINGS)
+    return storage
+
+def default_reset_rule(tab_name):
+    """The rule of tabs without their own: Dailies and names ending in Daily, Weekly or Monthly reset on that cadence"""
+    name = tab_name.lower()
+    if tab_name == "Dailies" or name.endswith("daily"):
+        return "daily"
+    if name.endswith("weekly"):
+        return "weekly"
+    if name.endswith("monthly"):
+        return "monthly"
+    return None
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+class KaizenStore:
+    """Tabs, tasks, completion states, settings and resets, with no UI attached.
+
+    Every change goes through commit(), which applies it to the in-memory
+    store under `lock` and hands it to the background writer. The Tk app,
+    the CLI and scripts all drive the same methods; callers on other
+    threads should hold `lock` while reading `tasks` or `task_states`.
+
+    Changes other processes make to a shared store are folded in as they
+    appear; on_change(tab_names) is then called with the tabs that changed.
+
+    Changes made here can be taken back with undo() and redo(); each
+    public method is one step (see undoable()).
+    """
+
+    def __init__(self, storage, history=None):
+        self.storage = storage
+        # Every completion also lands in the append-only history, which resets never touch
+        self.history = history
+        self._stats = None
+        self._scheduler = None
+        self._search_index = None
+        self._undo_entry = None      # the UndoEntry being recorded, if any
+        self._undo_positions = None
+        self._replaying = None       # "undo" or "redo" while one runs
+        # A copy: without a settings file, the defaults themselves would become this store's settings
+        self.tasks, self.task_states, self.settings = storage.load({"Dailies": DAILY_TASKS},
+                                                                   copy.deepcopy(DEFAULT_SETTINGS))
+        # Settings files from older versions lack newer keys, and every tab needs a place in tab_order
+        upgrade_settings(self.settings, DEFAULT_SETTINGS, list(self.tasks))
+        # Guards tasks, task_states and settings: resets mutate them from the scheduler thread
+        self.lock = threading.RLock()
+        # All disk writes happen on this writer's thread, batched per save_delay_ms
+        self.writer = PersistenceWriter(storage, self.lock, lambda: (self.tasks, self.task_states, self.settings),
+                                        delay=self.settings.get("save_delay_ms", 500) / 1000)
+        self.writer.start()
+        self.undo_history = UndoHistory(self.settings["undo_depth"])
+        self.on_change = None
+        self.watcher = None
+        if hasattr(storage, "on_remote"):
+            storage.on_remote = self.apply_remote
+            self.watcher = ChangeWatcher(storage).start()
+
+    @classmethod
+    def open(cls, data_dir="."):
+        return cls(open_storage(data_dir), CompletionLog(data_dir))
+
+    def commit(self, op):
+        """Apply an operation to the in-memory store and queue it for the storage backend"""
+        return self.commit_many([op])[0]
+
+    def commit_many(self, ops):
+        """Apply a batch of operations as one step; nothing else runs in between.
+
+        Completions set or taken back by set_state ops, including those of
+        undo and redo, go to the completion history. Only tasks there before
+        and after the step count: the state a deleted, restored or moved task
+        carries along is no completion of its own.
+        """
+        if not ops:
+            return ops
+        events = []
+        created = set()  # (tab, task_id) of tasks that appeared during this step
+        with self.undoable(ops[0]["op"].replace("_", " ").capitalize()):
+            for op in ops:
+                # Worked out before the change, while what it replaces is still there
+                self._undo_entry.add(inverse_ops(self.tasks, self.task_states, op, self._undo_positions))
+                kind, tab_name = op["op"], op.get("tab")
+                if kind == "set_state":
+                    events += self._completion_events(op)
+                old_list = self.tasks.get(tab_name) if kind == "set_tasks" else None
+                apply_op(self.tasks, self.task_states, op)
+                if kind == "add_task":
+                    created.add((tab_name, op["id"]))
+                elif kind == "set_tasks":
+                    created.update((tab_name, task_id) for task_id in self.tasks[tab_name].ids()
+                                   if old_list is None or not old_list.has_id(task_id))
+                elif kind == "rename_tab" and op["new_tab"] in self.tasks:
+                    created.update((op["new_tab"], task_id) for task_id in self.tasks[op["new_tab"]].ids())
+                self.writer.add_op(op)
+                if self._search_index is not None:
+                    self._search_index.apply(op, self.tasks)
+            if self.history is not None:
+                self.history.append([event for event in events if (event[0], event[1]) not in created
+                                     and event[0] in self.tasks and self.tasks[event[0]].has_id(event[1])])
+        return ops
+
+    def _completion_events(self, op):
+        task_list = self.tasks.get(op["tab"])
+        task_id = resolve_task_id(task_list, op)
+        if task_id is None or not task_list.has_id(task_id):
+            return []
+        return completion_events(self.task_states.get(op["tab"], {}).get(task_id), op["state"], op["tab"],
+                                 task_id, task_list.text_of(task_id), date.today())
+
+    def merge_import(self, records, report):
+        """Merge a batch of imported records (see merge_records) and return the operations.
+
+        All batches of one report are undone together. Imported completions
+        go to the completion history like any other.
+        """
+        # Imported on first use, like the search index, so they don't slow down every start
+        from kaizen_import import merge_records
+        events = []
+        with self.undoable("Import", group=report):
+            ops = merge_records(self.tasks, self.task_states, records, report)
+            for op in ops:
+                if op["op"] == "set_state":
+                    # Only tasks the import itself added get a state, so they had none before
+                    events += completion_events(None, op["state"], op["tab"], op["id"],
+                                                self.tasks[op["tab"]].text_of(op["id"]), date.today())
+                self.writer.add_op(op)
+                if self._search_index is not None:
+                    self._search_index.apply(op, self.tasks)
+                # An import only ever adds, so deleting what it added undoes it
+                if op["op"] == "add_tab":
+                    self.settings["tab_order"].append(op["tab"])
+                    self._undo_entry.add([{"op": "delete_tab", "tab": op["tab"]}])
+                elif op["op"] == "add_task":
+                    self._undo_entry.add([{"op": "delete_task", "tab": op["tab"], "id": op["id"]}])
+            if self.history is not None:
+                self.history.append(events)
+        if any(op["op"] == "add_tab" for op in ops):
+            self.save_settings()
+        return ops
+
+    # Undo
+
+    @contextmanager
+    def undoable(self, label, group=None, record=True):
+        """Record everything committed inside the block as one undo step.
+
+        Holds the store lock throughout; nested blocks join the outer one.
+        Steps sharing a group (e.g. the batches of one import) merge. With
+        record=False the block is kept off the history altogether, e.g. a
+        scheduled reset that nobody asked for and nobody should undo by accident.
+        """
+        with self.lock:
+            if self._undo_entry is not None:
+                yield self._undo_entry
+                return
+            entry = self._undo_entry = UndoEntry(label, group)
+            self._undo_positions = TabPositions()
+            before = {key: copy.deepcopy(self.settings[key]) for key in UNDO_SETTINGS}
+            try:
+                yield entry
+            finally:
+                self._undo_entry = self._undo_positions = None
+                for key in UNDO_SETTINGS:
+                    if self.settings[key] != before[key]:
+                        entry.settings[key] = (before[key], copy.deepcopy(self.settings[key]))
+                if record and (entry.inverse_parts or entry.settings):
+                    if self._replaying == "undo":
+                        self.undo_history.push_redo(entry)
+                    else:
+                        self.undo_history.push(entry, clear_redo=self._replaying is None)
+
+    def undo(self):
+        """Take back the latest change; returns (label, tabs changed), or None if there is none"""
+        return self._replay("undo", self.undo_history.pop_undo)
+
+    def redo(self):
+        """Make the latest undone change again; returns (label, tabs changed), or None if there is none"""
+        return self._replay("redo", self.undo_history.pop_redo)
+
+    def _replay(self, kind, pop):
+        with self.lock:
+            entry = pop()
+            if entry is None:
+                return None
+            ops = compact_restores(entry.inverse(), self.tasks)
+            # Applying the inverse records its own inverse, which goes on the other stack
+            self._replaying = kind
+            try:
+                with self.undoable(entry.label):
+                    self.commit_many(ops)
+                    for key, (before, _) in entry.settings.items():
+                        self.settings[key] = copy.deepcopy(before)
+                    upgrade_settings(self.settings, DEFAULT_SETTINGS, list(self.tasks))
+            finally:
+                self._replaying = None
+            changed = set()
+            for op in ops:
+                changed.update(self.tasks if op["op"] == "clear_states" and op["tab"] is None else [op["tab"]])
+                if op["op"] == "rename_tab":
+                    changed.add(op["new_tab"])
+        if entry.settings:
+            self.save_settings()
+        self._reschedule()
+        return entry.label, changed
+
+    def apply_remote(self, ops, snapshot=None):
+        """Fold in changes another process wrote to the shared store.
+
+        Our own operations that aren't written yet come after them in the
+        journal, so they are applied again on top to keep memory in the same order.
+        """
+        changed = set()
+        with self.lock:
+            if snapshot is not None:
+                changed |= replace_changed_tabs(self.tasks, self.task_states, *snapshot)
+            for op in ops + self.writer.unwritten():
+                apply_op(self.tasks, self.task_states, op)
+                if op["op"] == "clear_states" and op["tab"] is None:
+                    changed.update(self.tasks)
+                else:
+                    changed.add(op["tab"])
+                if op["op"] == "rename_tab":
+                    changed.add(op["new_tab"])
+            upgrade_settings(self.settings, DEFAULT_SETTINGS, list(self.tasks))
+            if self._search_index is not None:
+                for tab_name in changed:
+                    self._search_index.reindex_tab(tab_name, self.tasks.get(tab_name))
+        if changed:
+            self._reschedule()
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+        return changed
+
+    def save_settings(self):
+        # Unchanged settings are never rewritten
+        self.writer.mark_settings_dirty()
+
+    def replace_settings(self, new_settings):
+        """Swap in imported settings, keeping the same dict so everyone holding it sees the change"""
+        with self.lock:
+            self.settings.clear()
+            self.settings.update(new_settings)
+            upgrade_settings(self.settings, DEFAULT_SETTINGS, list(self.tasks))
+        self.save_settings()
+
+    # Tabs
+
+    def tab_names(self):
+        """Tabs in display order"""
+        return [tab_name for tab_name in self.settings["tab_order"] if tab_name in self.tasks]
+
+    def set_tab_order(self, tab_names):
+        """Put tabs in this display order; tabs left out keep their relative order at the end"""
+        with self.undoable("Reorder tabs"):
+            order = [tab_name for tab_name in dict.fromkeys(tab_names) if tab_name in self.tasks]
+            order += [tab_name for tab_name in self.settings["tab_order"] if tab_name not in order]
+            if order == self.settings["tab_order"]:
+                return False
+            self.settings["tab_order"] = order
+        self.save_settings()
+        return True
+
+    def add_tab(self, tab_name):
+        """Create a tab; returns False for blank or existing names"""
+        tab_name = tab_name.strip()
+        with self.undoable("Add tab"):
+            if not tab_name or tab_name in self.tasks:
+                return False
+            self.commit({"op": "add_tab", "tab": tab_name})
+            self.settings["tab_order"].append(tab_name)
+            # Its reset schedule starts now
+            self.settings["tab_resets"][tab_name] = datetime.now().isoformat(timespec="seconds")
+        self.save_settings()
+        self._reschedule()
+        return True
+
+    def delete_tab(self, tab_name):
+        """Delete a tab with its tasks and states; protected tabs are kept"""
+        if tab_name in PROTECTED_TABS:
+            return False
+        with self.undoable("Delete tab"):
+            if tab_name not in self.tasks:
+                return False
+            self.commit({"op": "delete_tab", "tab": tab_name})
+            if tab_name in self.settings["tab_order"]:
+                self.settings["tab_order"].remove(tab_name)
+            self.settings["reset_rules"].pop(tab_name, None)
+            self.settings["tab_resets"].pop(tab_name, None)
+        self.save_settings()
+        self._reschedule()
+        return True
+
+    # Tasks
+
+    def add_task(self, tab_name, text):
+        """Append a task; returns its id, or None for blank or duplicate text"""
+        return (self.add_tasks(tab_name, [text]) or [None])[0]
+
+    def add_tasks(self, tab_name, texts):
+        """Append tasks to a tab (creating it if needed) in one step; returns the new ids"""
+        tab_name = tab_name.strip()
+        if not tab_name:
+            return []
+        ops = []
+        with self.undoable("Add tasks"):
+            if tab_name not in self.tasks:
+                self.add_tab(tab_name)
+            task_list = self.tasks[tab_name]
+            for text in texts:
+                text = text.strip()
+                if text and text not in task_list:
+                    ops.append(self.commit({"op": "add_task", "tab": tab_name, "task": text}))
+        return [op["id"] for op in ops]
+
+    def delete_tasks(self, tab_name, task_ids):
+        """Delete tasks (and their states) by id; returns how many existed"""
+        with self.undoable("Delete tasks"):
+            task_list = self.tasks.get(tab_name)
+            ops = [{"op": "delete_task", "tab": tab_name, "id": task_id}
+                   for task_id in dict.fromkeys(task_ids) if task_list is not None and task_list.has_id(task_id)]
+            self.commit_many(ops)
+        return len(ops)
+
+    def move_tasks(self, tab_name, task_ids, to_tab):
+        """Move tasks, with their states, to another tab (creating it if needed) in one step.
+
+        Tasks keep their order; ones whose text the other tab already has
+        stay where they are. Returns how many moved.
+        """
+        to_tab = to_tab.strip()
+        with self.undoable("Move tasks"):
+            task_list = self.tasks.get(tab_name)
+            if task_list is None or not to_tab or to_tab == tab_name:
+                return 0
+            if to_tab not in self.tasks:
+                self.add_tab(to_tab)
+            wanted = set(task_ids)
+            target = self.tasks[to_tab]
+            tab_states = self.task_states.get(tab_name, {})
+            ops = []
+            moved = 0
+            for task_id, text in task_list.items():
+                if task_id not in wanted or text in target:
+                    continue
+                # Keep the id unless the other tab already uses it
+                new_id = task_id if not target.has_id(task_id) else new_task_id()
+                ops.append({"op": "add_task", "tab": to_tab, "task": text, "id": new_id})
+                if tab_states.get(task_id):
+                    ops.append({"op": "set_state", "tab": to_tab, "id": new_id, "state": tab_states[task_id]})
+                ops.append({"op": "delete_task", "tab": tab_name, "id": task_id})
+                moved += 1
+            self.commit_many(ops)
+        return moved
+
+    def is_completed(self, tab_name, task_id):
+        state = self.task_states.get(tab_name, {}).get(task_id)
+        return bool(state and state["completed"])
+
+    def set_completed(self, tab_name, task_ids, completed):
+        """Mark tasks done (dated today) or not done; returns how many changed"""
+        ops = []
+        with self.undoable("Mark done" if completed else "Mark not done"):
+            tab_states = self.task_states.get(tab_name, {})
+            for task_id in dict.fromkeys(task_ids):
+                if not self.tasks.get(tab_name) or not self.tasks[tab_name].has_id(task_id):
+                    continue
+                if self.is_completed(tab_name, task_id) == completed:
+                    continue
+                if completed:
+                    state = {"completed": True, "date_completed": today()}
+                else:
+                    state = dict(tab_states[task_id], completed=False)
+                ops.append({"op": "set_state", "tab": tab_name, "id": task_id, "state": state})
+            self.commit_many(ops)
+        return len(ops)
+
+    def toggle_tasks(self, tab_name, task_ids):
+        """Flip the completion of each task"""
+        with self.undoable("Toggle completion"):
+            done = [task_id for task_id in task_ids if self.is_completed(tab_name, task_id)]
+            not_done = [task_id for task_id in task_ids if not self.is_completed(tab_name, task_id)]
+            return self.set_completed(tab_name, done, False) + self.set_completed(tab_name, not_done, True)
+
+    def rows(self, tab_name, first=0, last=None):
+        """(task_id, text, completed) for the tasks displayed at positions first..last-1"""
+        with self.lock:
+            task_list = self.tasks.get(tab_name)
+            if task_list is None:
+                return []
+            if last is None:
+                last = len(task_list)
+            return self.task_rows(tab_name, task_list.ids_between(first, last))
+
+    def task_rows(self, tab_name, task_ids):
+        """(task_id, text, completed) for the given tasks of a tab, skipping ones that are gone"""
+        with self.lock:
+            task_list = self.tasks.get(tab_name)
+            if task_list is None:
+                return []
+            tab_states = self.task_states.get(tab_name, {})
+            return [(task_id, task_list.text_of(task_id), task_id in tab_states and tab_states[task_id]["completed"])
+                    for task_id in task_ids if task_list.has_id(task_id)]
+
+    def search_index(self):
+        """The SearchIndex over every tab, built on first use and kept current by every change after"""
+        with self.lock:
+            if self._search_index is None:
+                from kaizen_search import SearchIndex
+                self._search_index = SearchIndex(self.tasks)
+            return self._search_index
+
+    def search(self, query, tab_name=None, limit=None):
+        """[(tab, task_id)] whose text has every word of query, the last one as a prefix.
+
+        Searches one tab, or every tab in display order; see SearchIndex.search.
+        """
+        index = self.search_index()
+        with self.lock:
+            return index.search(query, tab_name, self.tab_names(), limit)
+
+    def stats(self):
+        """CompletionStats over the history, brought up to date (None without a history)"""
+        if self.history is None:
+            return None
+        if self._stats is None:
+            self._stats = CompletionStats(self.history, self.history.stats_file)
+        else:
+            self._stats.update()
+        return self._stats
+
+    # Resets
+
+    def reset_all(self):
+        """Mark every task in every tab not done"""
+        with self.undoable("Reset all tasks"):
+            self.commit({"op": "clear_states", "tab": None})
+
+    def reset_tab(self, tab_name):
+        with self.undoable("Reset tab"):
+            self.commit({"op": "clear_states", "tab": tab_name})
+
+    def reset_dailies(self):
+        """Reset daily tasks to their default state"""
+        with self.undoable("Reset dailies"):
+            if "Dailies" in self.tasks:
+                self.commit({"op": "set_tasks", "tab": "Dailies", "tasks": DAILY_TASKS})
+                # Reset completion states for daily tasks
+                self.reset_tab("Dailies")
+
+    def reset_rule(self, tab_name):
+        """The tab's RecurrenceRule, or None if it never resets on its own"""
+        text = self.settings["reset_rules"].get(tab_name)
+        if text:
+            try:
+                return RecurrenceRule(text)
+            except ValueError:
+                # A hand-edited rule that doesn't parse falls back to the default
+                pass
+        text = default_reset_rule(tab_name)
+        return RecurrenceRule(text) if text else None
+
+    def reset_rules(self):
+        """{tab: RecurrenceRule} for every tab with scheduled resets"""
+        with self.lock:
+            rules = {tab_name: self.reset_rule(tab_name) for tab_name in self.tasks}
+        return {tab_name: rule for tab_name, rule in rules.items() if rule is not None and rule.kind != "never"}
+
+    def set_reset_rule(self, tab_name, text):
+        """Give a tab its own reset rule, or go back to the default with a blank one; raises ValueError"""
+        with self.undoable("Set reset rule"):
+            if tab_name not in self.tasks:
+                raise ValueError(f"no tab named {tab_name!r}")
+            if text and text.strip():
+                self.settings["reset_rules"][tab_name] = str(RecurrenceRule(text))
+            else:
+                self.settings["reset_rules"].pop(tab_name, None)
+        self.save_settings()
+        self._reschedule()
+
+    def next_reset(self, tab_name):
+        """When the tab resets next (an overdue reset runs right away), or None"""
+        rule = self.reset_rule(tab_name)
+        if rule is None:
+            return None
+        last_run = self.settings["tab_resets"].get(tab_name)
+        after = datetime.fromisoformat(last_run) if last_run else datetime.now()
+        return rule.next_after(after, (self.settings["reset_hour"], self.settings["reset_minute"]))
+
+    def reset_tabs(self, tab_names, when):
+        """Run the scheduled reset of each tab and return the tabs that still exist"""
+        changed = []
+        # Leaves the user's undo and redo history as it was
+        with self.undoable("Reset tabs", record=False):
+            for tab_name in tab_names:
+                if tab_name not in self.tasks:
+                    continue
+                if tab_name == "Dailies":
+                    self.reset_dailies()
+                else:
+                    self.reset_tab(tab_name)
+                # Remember the reset so a missed one can be caught up on next launch
+                self.settings["tab_resets"][tab_name] = when.isoformat(timespec="seconds")
+                changed.append(tab_name)
+        self.save_settings()
+        return changed
+
+    def run_reset(self, kind, when):
+        """Reset every tab whose rule is of this kind (daily, weekly, monthly ...) and return them"""
+        return self.reset_tabs([tab_name for tab_name, rule in self.reset_rules().items() if rule.kind == kind], when)
+
+    def reset_scheduler(self, on_reset=None):
+        """A ResetScheduler that runs this store's resets, catching up on ones missed while closed.
+
+        on_reset(changed_tabs) is called after each round of resets, on the scheduler's thread.
+        """
+        now = datetime.now()
+        with self.lock:
+            tab_resets = self.settings["tab_resets"]
+            # Stores from before per-tab rules remember one last run per reset kind
+            legacy_resets = self.settings.pop("last_resets", None) or {}
+            last_runs = {}
+            for tab_name in self.tasks:
+                when = tab_resets.get(tab_name)
+                if when is None:
+                    rule = self.reset_rule(tab_name)
+                    when = legacy_resets.get(rule.kind) if rule is not None else None
+                    tab_resets[tab_name] = when or now.isoformat(timespec="seconds")
+                last_runs[tab_name] = datetime.fromisoformat(tab_resets[tab_name])
+        self.save_settings()
+
+        def run(tab_names, when):
+            changed = self.reset_tabs(tab_names, when)
+            if on_reset is not None:
+                on_reset(changed)
+
+        self._scheduler = ResetScheduler(
+            self.reset_rules,
+            lambda: (self.settings["reset_hour"], self.settings["reset_minute"]),
+            last_runs, run)
+        return self._scheduler
+
+    def _reschedule(self):
+        if self._scheduler is not None:
+            self._scheduler.reschedule()
+
+    # Lifecycle
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        """Write everything out and release the storage backend"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.writer.close()
+        self.storage.close(self.tasks, self.task_states)
+        if self._stats is not None and self._stats.unsaved():
+            self._stats.save()
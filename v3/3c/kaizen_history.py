@@ -0,0 +1,356 @@
+import json
+import os
+import sys
+import tempfile
+from array import array
+from datetime import date
+from kaizen_sync import FileLock
+
+# Task states only hold the latest completion and resets clear them, so
+# every completion is also appended here and never deleted:
+#
+#   history.bin   one pair of little-endian u32s per event: the day
+#                 (date.toordinal()) and key * 2 + completed
+#   history.keys  one JSON [tab, task_id, text] line per key; a key's
+#                 number is its line number
+#
+# Both files load straight into arrays, and new events are only ever
+# appended, so the stats below update from where they left off.
+HISTORY_FILE = "history.bin"
+HISTORY_KEYS_FILE = "history.keys"
+HISTORY_LOCK_FILE = "history.lock"
+# The stats aggregates are cached here, so a start only folds in events newer than the cache
+STATS_CACHE_FILE = "history.stats"
+STATS_CACHE_EVERY = 10000  # events folded in before the cache is rewritten
+
+RECORD_SIZE = 8
+
+def _u32_array(data):
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _parse_key(line):
+    """One history.keys line; a damaged one keeps its key number but matches no task"""
+    try:
+        return _valid_key(json.loads(line))
+    except ValueError:
+        return None, None, None
+
+def _valid_key(key):
+    if isinstance(key, list) and len(key) == 3 and isinstance(key[0], str):
+        return key
+    return None, None, None
+
+class CompletionLog:
+    """Append-only completion events, held in memory as parallel arrays.
+
+    Nothing is read until first needed (refresh(), append() or stats), so
+    opening a store doesn't pay for a long history.
+    """
+
+    def __init__(self, data_dir="."):
+        self.bin_file = os.path.join(data_dir, HISTORY_FILE)
+        self.keys_file = os.path.join(data_dir, HISTORY_KEYS_FILE)
+        self.stats_file = os.path.join(data_dir, STATS_CACHE_FILE)
+        self.file_lock = FileLock(os.path.join(data_dir, HISTORY_LOCK_FILE))
+        self.days = array("I")
+        self.codes = array("I")
+        self.keys = []        # [tab, task_id, text] per key number
+        self.key_numbers = {}  # (tab, task_id) -> key number
+        self._bin_offset = 0
+        self._keys_offset = 0
+
+    def __len__(self):
+        return len(self.days)
+
+    def refresh(self):
+        """Pick up events other processes appended since the last look"""
+        try:
+            with open(self.keys_file, "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        end = data.rfind(b"\n") + 1
+        if end:
+            try:
+                # One parse for all the lines is several times faster than one per line
+                keys = [_valid_key(key) for key in json.loads(b"[" + data[:end - 1].replace(b"\n", b",") + b"]")]
+            except ValueError:
+                keys = [_parse_key(line) for line in data[:end - 1].split(b"\n")]
+            for tab_name, task_id, text in keys:
+                if tab_name is not None:
+                    self.key_numbers[(tab_name, task_id)] = len(self.keys)
+                self.keys.append([tab_name, task_id, text])
+        self._keys_offset += end
+
+        try:
+            with open(self.bin_file, "rb") as f:
+                f.seek(self._bin_offset)
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        # A record still being written is picked up on the next refresh
+        data = data[:len(data) - len(data) % RECORD_SIZE]
+        records = _u32_array(data)
+        self.days.extend(records[0::2])
+        self.codes.extend(records[1::2])
+        self._bin_offset += len(data)
+
+    def append(self, events):
+        """Record (tab, task_id, text, day, completed) events, day being a date"""
+        if not events:
+            return
+        with self.file_lock:
+            self.refresh()
+            # Cut off what a crash mid-append left behind, or the next line or
+            # record would be glued onto it and every later one misread
+            for path, offset in ((self.keys_file, self._keys_offset), (self.bin_file, self._bin_offset)):
+                if os.path.exists(path) and os.path.getsize(path) > offset:
+                    os.truncate(path, offset)
+            new_keys = []
+            records = array("I")
+            for tab_name, task_id, text, day, completed in events:
+                key = self.key_numbers.get((tab_name, task_id))
+                if key is None:
+                    key = self.key_numbers[(tab_name, task_id)] = len(self.keys)
+                    self.keys.append([tab_name, task_id, text])
+                    new_keys.append([tab_name, task_id, text])
+                records.append(day.toordinal())
+                records.append(key * 2 + bool(completed))
+            if new_keys:
+                with open(self.keys_file, "ab") as f:
+                    data = "".join(json.dumps(key) + "\n" for key in new_keys).encode("utf-8")
+                    f.write(data)
+                self._keys_offset += len(data)
+            self.days.extend(records[0::2])
+            self.codes.extend(records[1::2])
+            if sys.byteorder == "big":
+                records.byteswap()
+            data = records.tobytes()
+            with open(self.bin_file, "ab") as f:
+                f.write(data)
+                self._bin_offset = f.tell()
+
+class CompletionStats:
+    """Streaks, completion rates and weekly/monthly rollups over a CompletionLog.
+
+    Keeps, per key, a bytearray with one flag per day since the first event
+    and, per tab, an array of completions per day. update() only folds in
+    events appended since the last call, so queries stay cheap however
+    long the history gets.
+    """
+
+    def __init__(self, log, cache_file=None):
+        self.log = log
+        self.cache_file = cache_file
+        self.first_day = None  # ordinal of index 0 in the per-day arrays
+        self.flags = []        # per key: bytearray, 1 where the task was completed that day
+        self.tab_counts = {}   # tab -> array of completions per day
+        self.span = 0          # days covered by the per-day arrays
+        self._key_counts = []  # per key: its tab's tab_counts array
+        self._consumed = 0
+        self._saved = 0
+        log.refresh()
+        if cache_file is not None:
+            self._load_cache()
+        self.update()
+        if cache_file is not None and self.unsaved() >= STATS_CACHE_EVERY:
+            self.save()
+
+    def unsaved(self):
+        """Events folded in since the cache was last written"""
+        return self._consumed - self._saved
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                data = f.read()
+            header_end = data.index(b"\n")
+            header = json.loads(data[:header_end])
+            consumed, span, key_count, tab_names = header["consumed"], header["span"], header["keys"], header["tabs"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        # A cache of a different or rewritten history is ignored
+        if (consumed > len(self.log) or key_count > len(self.log.keys)
+                or len(data) != header_end + 1 + key_count * span + 4 * span * len(tab_names)):
+            return
+        pos = header_end + 1
+        self.flags = [bytearray(data[pos + key * span:pos + (key + 1) * span]) for key in range(key_count)]
+        pos += key_count * span
+        for tab_name in tab_names:
+            counts = self.tab_counts[tab_name] = array("i")
+            counts.frombytes(data[pos:pos + 4 * span])
+            if sys.byteorder == "big":
+                counts.byteswap()
+            pos += 4 * span
+        self._key_counts = [self.tab_counts[tab_name] for tab_name, _, _ in self.log.keys[:key_count]]
+        self.first_day, self.span = header["first_day"], span
+        self._consumed = self._saved = consumed
+
+    def save(self):
+        """Write the aggregates to the cache file"""
+        header = {"consumed": self._consumed, "first_day": self.first_day, "span": self.span,
+                  "keys": len(self.flags), "tabs": list(self.tab_counts)}
+        # Two processes may save at once, so each writes a temp file of its own
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.cache_file) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(self.cache_file) or ".")
+        with open(fd, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for key_flags in self.flags:
+                f.write(key_flags)
+            for counts in self.tab_counts.values():
+                if sys.byteorder == "big":
+                    counts = array("i", counts)
+                    counts.byteswap()
+                f.write(counts.tobytes())
+        os.replace(tmp_file, self.cache_file)
+        self._saved = self._consumed
+
+    def update(self):
+        log = self.log
+        log.refresh()
+        if self._consumed == len(log):
+            return
+        days = log.days[self._consumed:]
+        codes = log.codes[self._consumed:]
+        self._consumed = len(log)
+        self._cover(min(days), max(days))
+        flags = self.flags
+        while len(flags) < len(log.keys):
+            flags.append(bytearray(self.span))
+        tab_counts = self.tab_counts
+        for tab_name, _, _ in log.keys[len(self._key_counts):]:
+            if tab_name not in tab_counts:
+                tab_counts[tab_name] = array("i", bytes(4 * self.span))
+            self._key_counts.append(tab_counts[tab_name])
+        key_counts = self._key_counts
+        first_day = self.first_day
+        for day, code in zip(days, codes):
+            key = code >> 1
+            key_flags = flags[key]
+            index = day - first_day
+            completed = code & 1
+            if key_flags[index] != completed:
+                key_flags[index] = completed
+                key_counts[key][index] += 2 * completed - 1
+
+    def _cover(self, low, high):
+        """Grow every per-day array so days low..high have a slot"""
+        if self.first_day is None:
+            self.first_day = low
+        before = max(0, self.first_day - low)
+        self.first_day -= before
+        span = max(self.span + before, high - self.first_day + 1)
+        for key_flags in self.flags:
+            key_flags[0:0] = bytes(before)
+            key_flags.extend(bytes(span - len(key_flags)))
+        for tab_name, counts in self.tab_counts.items():
+            grown = array("i", bytes(4 * before))
+            grown.extend(counts)
+            grown.extend(array("i", bytes(4 * (span - len(grown)))))
+            self.tab_counts[tab_name] = grown
+        self._key_counts = [self.tab_counts[tab_name] for tab_name, _, _ in self.log.keys[:len(self._key_counts)]]
+        self.span = span
+
+    def _key_flags(self, tab_name, task_id):
+        key = self.log.key_numbers.get((tab_name, task_id))
+        return self.flags[key] if key is not None and key < len(self.flags) else None
+
+    def _index(self, day):
+        return day.toordinal() - self.first_day
+
+    def current_streak(self, tab_name, task_id, today=None):
+        """Days in a row the task was completed, up to today (or yesterday, while today is open)"""
+        key_flags = self._key_flags(tab_name, task_id)
+        if key_flags is None:
+            return 0
+        end = self._index(today or date.today()) + 1
+        if end > len(key_flags) or not key_flags[end - 1]:
+            end -= 1
+        if end <= 0 or end > len(key_flags):
+            return 0
+        return end - key_flags.rfind(b"\0", 0, end) - 1
+
+    def longest_streak(self, tab_name, task_id):
+        key_flags = self._key_flags(tab_name, task_id)
+        if key_flags is None:
+            return 0
+        return max(map(len, bytes(key_flags).split(b"\0")))
+
+    def completions(self, tab_name, task_id):
+        """Days the task was completed on"""
+        key_flags = self._key_flags(tab_name, task_id)
+        return key_flags.count(1) if key_flags is not None else 0
+
+    def task_summary(self, tab_name, today=None):
+        """(task_id, text, completions, current streak, longest streak) for every task with history in a tab"""
+        return [(task_id, text, self.completions(tab_name, task_id),
+                 self.current_streak(tab_name, task_id, today), self.longest_streak(tab_name, task_id))
+                for tab, task_id, text in self.log.keys if tab == tab_name]
+
+    def completed_between(self, tab_name, first, last):
+        """Completions in a tab from day first through day last"""
+        counts = self.tab_counts.get(tab_name)
+        if counts is None:
+            return 0
+        return sum(counts[max(0, self._index(first)):max(0, self._index(last) + 1)])
+
+    def completion_rate(self, tab_name, task_count, first, last):
+        """Share of the possible task-days from first through last that were completed"""
+        days = (last - first).days + 1
+        if task_count <= 0 or days <= 0:
+            return 0.0
+        return self.completed_between(tab_name, first, last) / (task_count * days)
+
+    def rollup(self, tab_name=None, period="week"):
+        """[(period label, completions)] per ISO week ("2024-W05") or month ("2024-02"), oldest first"""
+        tab_names = [tab_name] if tab_name is not None else list(self.tab_counts)
+        totals = {}
+        for name in tab_names:
+            counts = self.tab_counts.get(name)
+            if counts is None:
+                continue
+            for index, count in enumerate(counts):
+                if count:
+                    day = date.fromordinal(self.first_day + index)
+                    if period == "week":
+                        year, week, _ = day.isocalendar()
+                        label = f"{year}-W{week:02d}"
+                    else:
+                        label = f"{day.year}-{day.month:02d}"
+                    totals[label] = totals.get(label, 0) + count
+        return sorted(totals.items())
+
+def completion_events(old_state, new_state, tab_name, task_id, text, today):
+    """The history events for one task's state change (possibly none)"""
+    was_done = bool(old_state and old_state.get("completed"))
+    done = bool(new_state and new_state.get("completed"))
+    if was_done == done:
+        return []
+    if done:
+        return [(tab_name, task_id, text, _day(new_state.get("date_completed")) or today, True)]
+    # Un-completing takes back the completion on the day it was made
+    return [(tab_name, task_id, text, _day(old_state.get("date_completed")) or today, False)]
+
+def _day(value):
+    try:
+        return date.fromisoformat(value[:10]) if value else None
+    except ValueError:
+        return None
+
+def summary_lines(stats, tab_name, task_count, today=None):
+    """Readable completion rates and streaks for one tab"""
+    today = today or date.today()
+    lines = [tab_name]
+    for days in (7, 30, 365):
+        first = date.fromordinal(today.toordinal() - days + 1)
+        rate = stats.completion_rate(tab_name, task_count, first, today)
+        lines.append(f"  last {days} days: {rate:.0%} done ({stats.completed_between(tab_name, first, today)} completions)")
+    rows = sorted(stats.task_summary(tab_name, today), key=lambda row: (-row[3], -row[2]))
+    for _, text, completions, current, longest in rows:
+        lines.append(f"  {text}: streak {current} (best {longest}), done {completions} times")
+    return lines
@@ -0,0 +1,319 @@
+import csv
+import json
+import os
+import threading
+from kaizen_schema import LEGACY_TAB_NAMES, normalize_tasks, tab_items
+from kaizen_storage import apply_op
+
+# Records are merged into the store this many at a time, so memory stays
+# bounded by one batch plus one read chunk however large the file is
+IMPORT_BATCH = 1000
+CHUNK_SIZE = 1 << 16
+MAX_REPORTED_ERRORS = 20
+
+TRUE_FLAGS = {"1", "true", "yes", "y", "x", "done", "completed"}
+FALSE_FLAGS = {"", "0", "false", "no", "n"}
+
+class ImportReport:
+    """Running totals of an import, shared with the progress callback"""
+
+    def __init__(self):
+        self.records = 0
+        self.added = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.new_tabs = []
+        self.errors = []    # the first MAX_REPORTED_ERRORS problems, as readable lines
+        self.failure = None  # set when the file itself couldn't be read
+        self.cancelled = False
+
+    def reject(self, where, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{where}: {message}")
+
+    def summary(self):
+        lines = [f"{self.added} tasks added, {self.duplicates} duplicates skipped, {self.invalid} invalid"]
+        if self.new_tabs:
+            lines.append(f"New tabs: {', '.join(self.new_tabs)}")
+        lines.extend(self.errors)
+        if self.invalid > len(self.errors):
+            lines.append(f"... and {self.invalid - len(self.errors)} more")
+        if self.failure:
+            lines.append(f"Import stopped: {self.failure}")
+        elif self.cancelled:
+            lines.append("Import cancelled")
+        return "\n".join(lines)
+
+class _JsonStream:
+    """Pulls one JSON value at a time out of a file without reading the whole file"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=CHUNK_SIZE):
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or "" at the end of the file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} but found {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer end may be cut short (e.g. a number)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"malformed JSON: {e.msg}")
+            # Grow the reads so one very large value doesn't get re-parsed per chunk
+            self._fill(size)
+            size *= 2
+
+# Top-level keys of the layouts from before tabs (v1 and mixed, see kaizen_schema)
+LEGACY_KEYS = set(LEGACY_TAB_NAMES) | {"completed"}
+
+def iter_json(f):
+    """Records of a {tab: [task, ...]} file, in any layout kaizen_schema knows about"""
+    stream = _JsonStream(f)
+    stream.expect("{")
+    yield from _iter_json_tabs(stream, True)
+
+def _iter_json_tabs(stream, top_level):
+    if stream.peek() == "}":
+        stream.pos += 1
+        return
+    versioned = False
+    while True:
+        tab_name = stream.value()
+        stream.expect(":")
+        if top_level and not versioned and tab_name in LEGACY_KEYS:
+            # Files from before tabs were small: read the rest whole and let kaizen_schema sort out the layout
+            yield from _iter_legacy(stream, tab_name)
+            return
+        if top_level and tab_name == "schema_version":
+            # A saved tasks.json: the tabs follow under "tabs"
+            stream.value()
+            versioned = True
+        elif versioned and tab_name == "tabs" and stream.peek() == "{":
+            stream.pos += 1
+            yield from _iter_json_tabs(stream, False)
+        elif stream.peek() == "[":
+            # Stream the tab's tasks one at a time
+            stream.pos += 1
+            if stream.peek() == "]":
+                stream.pos += 1
+                yield f"tab {tab_name!r}", {"tab": tab_name}
+            else:
+                index = 0
+                while True:
+                    index += 1
+                    yield f"tab {tab_name!r} task {index}", _task_record(tab_name, stream.value())
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            # Older layouts ({"tasks", "completed"} per tab) are read a tab at a time
+            try:
+                items, completed = tab_items(tab_name, stream.value())
+            except ValueError as e:
+                yield f"tab {tab_name!r}", {"error": str(e)}
+            else:
+                yield from _tab_records(tab_name, items, completed)
+        if stream.expect(",}") == "}":
+            break
+
+def _iter_legacy(stream, first_key):
+    raw = {first_key: stream.value()}
+    while stream.expect(",}") == ",":
+        key = stream.value()
+        stream.expect(":")
+        raw[key] = stream.value()
+    _, tabs, completed = normalize_tasks(raw)
+    for tab_name, items in tabs.items():
+        yield from _tab_records(tab_name, items, completed.get(tab_name, []))
+
+def _tab_records(tab_name, items, completed):
+    completed = set(completed)
+    yield f"tab {tab_name!r}", {"tab": tab_name}
+    for index, item in enumerate(items, 1):
+        record = _task_record(tab_name, item)
+        if record.get("task", record.get("text")) in completed:
+            record["completed"] = True
+        yield f"tab {tab_name!r} task {index}", record
+
+def _task_record(tab_name, item):
+    if isinstance(item, dict):
+        return dict(item, tab=tab_name)
+    return {"tab": tab_name, "task": item}
+
+def iter_jsonl(f):
+    """Records of a file with one {"tab", "task", ...} object per line"""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield f"line {line_number}", json.loads(line)
+        except json.JSONDecodeError as e:
+            yield f"line {line_number}", {"error": f"malformed JSON: {e.msg}"}
+
+def iter_csv(f):
+    """Records of a CSV file with a header row naming tab, task and optionally id, completed, date_completed"""
+    reader = csv.reader(f)
+    header = [name.strip().lower() for name in next(reader, [])]
+    if "tab" not in header or not {"task", "text"} & set(header):
+        raise ValueError("CSV header must name a tab column and a task column")
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield f"line {reader.line_num}", dict(zip(header, row))
+
+READERS = {".json": iter_json, ".jsonl": iter_jsonl, ".ndjson": iter_jsonl, ".csv": iter_csv}
+
+def normalize_record(raw):
+    """Validate one raw record and return (tab, text, task_id, state); raises ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("expected an object")
+    if "error" in raw:
+        raise ValueError(raw["error"])
+    tab_name = raw.get("tab")
+    if not isinstance(tab_name, str) or not tab_name.strip():
+        raise ValueError("missing tab name")
+    text = raw.get("task", raw.get("text"))
+    if text is None and set(raw) == {"tab"}:
+        # An empty tab still gets created
+        return tab_name.strip(), None, None, None
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("missing task text")
+    task_id = raw.get("id")
+    if not isinstance(task_id, str) or not task_id:
+        task_id = None
+
+    completed = raw.get("completed")
+    if isinstance(completed, str):
+        flag = completed.strip().lower()
+        if flag not in TRUE_FLAGS | FALSE_FLAGS:
+            raise ValueError(f"completed must be true or false, not {completed!r}")
+        completed = flag in TRUE_FLAGS
+    if completed is not None and not isinstance(completed, bool):
+        raise ValueError(f"completed must be true or false, not {completed!r}")
+    date_completed = raw.get("date_completed") or None
+    if date_completed is not None and not isinstance(date_completed, str):
+        raise ValueError("date_completed must be a string")
+    state = {"completed": True, "date_completed": date_completed} if completed else None
+    return tab_name.strip(), text.strip(), task_id, state
+
+def merge_records(tasks, task_states, records, report):
+    """Merge normalized records into the store and return the applied operations.
+
+    Tasks already in their tab (or earlier in the same import) are skipped,
+    so importing a file twice changes nothing. Call with the store lock held.
+    """
+    ops = []
+
+    def apply(op):
+        apply_op(tasks, task_states, op)
+        ops.append(op)
+
+    for tab_name, text, task_id, state in records:
+        if tab_name not in tasks:
+            apply({"op": "add_tab", "tab": tab_name})
+            report.new_tabs.append(tab_name)
+        if text is None:
+            continue
+        if text in tasks[tab_name]:
+            report.duplicates += 1
+            continue
+        op = {"op": "add_task", "tab": tab_name, "task": text}
+        if task_id is not None:
+            op["id"] = task_id
+        apply(op)
+        report.added += 1
+        if state is not None:
+            apply({"op": "set_state", "tab": tab_name, "id": op["id"], "state": state})
+    return ops
+
+class StreamingImporter:
+    """Reads a JSON, JSONL or CSV task file in batches and merges it into the store.
+
+    apply_batch(records, report) merges one batch of normalized records
+    (see merge_records); on_progress(report, fraction) is called after each
+    batch with the share of the file read so far. run() works on the
+    calling thread; start() runs it on a worker thread and passes the
+    final report to on_done.
+    """
+
+    def __init__(self, path, apply_batch, on_progress=None, batch_size=IMPORT_BATCH):
+        self.path = path
+        self.apply_batch = apply_batch
+        self.on_progress = on_progress
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self._cancelled = threading.Event()
+
+    def run(self):
+        report = self.report
+        reader = READERS.get(os.path.splitext(self.path)[1].lower(), iter_json)
+        batch = []
+        fraction = 0.0
+        try:
+            total = max(1, os.path.getsize(self.path))
+            with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+                for where, raw in reader(f):
+                    report.records += 1
+                    try:
+                        batch.append(normalize_record(raw))
+                    except ValueError as e:
+                        report.reject(where, e)
+                    if len(batch) >= self.batch_size:
+                        fraction = f.buffer.tell() / total
+                        self._flush(batch, fraction)
+                        batch = []
+                    if self._cancelled.is_set():
+                        report.cancelled = True
+                        break
+                fraction = 1.0
+        except (OSError, UnicodeDecodeError, ValueError, csv.Error) as e:
+            report.failure = str(e)
+        # Records read before a problem are still merged
+        if batch:
+            self._flush(batch, fraction)
+        return report
+
+    def _flush(self, batch, fraction):
+        self.apply_batch(batch, self.report)
+        if self.on_progress is not None:
+            self.on_progress(self.report, min(1.0, fraction))
+
+    def start(self, on_done):
+        threading.Thread(target=lambda: on_done(self.run()), daemon=True).start()
+
+    def cancel(self):
+        self._cancelled.set()
@@ -0,0 +1,259 @@
+import calendar
+import heapq
+import sys
+import threading
+from datetime import datetime, timedelta
+
+RESET_KINDS = ("daily", "weekly", "monthly")
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# How far ahead a cron rule is searched before it is declared unsatisfiable (e.g. Feb 30)
+CRON_SEARCH_DAYS = 366 * 5
+
+def next_daily(after, hour, minute):
+    """First daily reset instant strictly after `after`"""
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= after:
+        candidate += timedelta(days=1)
+    return candidate
+
+def _parse_time(text):
+    try:
+        hour, minute = (int(part) for part in text.split(":"))
+    except ValueError:
+        raise ValueError(f"expected a time like 06:30, not {text!r}")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"no such time: {text}")
+    return hour, minute
+
+def _parse_cron_field(text, low, high):
+    """The set of values a cron field (*, 5, 1-5, */15, 1,3,5 ...) allows"""
+    values = set()
+    for part in text.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            first, last = low, high
+        elif "-" in part:
+            first, last = (int(value) for value in part.split("-", 1))
+        else:
+            first = last = int(part)
+        step = int(step) if step else 1
+        if first < low or last > high or first > last or step < 1:
+            raise ValueError(f"cron field {text!r} is outside {low}-{high}")
+        values.update(range(first, last + 1, step))
+    return values
+
+class RecurrenceRule:
+    """When a tab resets, parsed from a short rule string kept in settings.
+
+        daily [HH:MM]               every day (default: the global reset time)
+        weekly [mon,thu,...] [HH:MM]  on those weekdays (default: Monday 00:00)
+        every N days [HH:MM]        N days after the last reset
+        monthly [DAY] [HH:MM]       on that day of the month (default: the 1st, 00:00)
+        month-end [HH:MM]           on the last day of the month (default: 23:59)
+        cron MIN HOUR DOM MON DOW   cron fields; DOW 0 or 7 is Sunday
+        never                       no scheduled reset
+    """
+
+    def __init__(self, text):
+        self.text = " ".join(text.lower().split())
+        words = self.text.split()
+        if not words:
+            raise ValueError("empty reset rule")
+        self.kind = words[0]
+        self.time = None  # (hour, minute); None means the kind's default
+        args = words[1:]
+        if self.kind != "cron" and args and ":" in args[-1]:
+            self.time = _parse_time(args.pop())
+
+        if self.kind in ("daily", "never", "month-end"):
+            if args:
+                raise ValueError(f"{self.kind} takes no arguments besides a time")
+        elif self.kind == "weekly":
+            names = args[0].split(",") if args else ["mon"]
+            if len(args) > 1 or any(name[:3] not in WEEKDAYS for name in names):
+                raise ValueError("weekly takes weekdays like mon,thu")
+            self.weekdays = {WEEKDAYS.index(name[:3]) for name in names}
+        elif self.kind == "every":
+            if len(args) != 2 or not args[0].isdigit() or int(args[0]) < 1 or args[1] not in ("day", "days"):
+                raise ValueError("expected every N days")
+            self.days = int(args[0])
+        elif self.kind == "monthly":
+            if len(args) > 1 or (args and not (args[0].isdigit() and 1 <= int(args[0]) <= 31)):
+                raise ValueError("monthly takes a day of the month, 1-31")
+            self.day = int(args[0]) if args else 1
+        elif self.kind == "cron":
+            if len(args) != 5:
+                raise ValueError("cron takes five fields: minute hour day-of-month month day-of-week")
+            try:
+                self.minutes = sorted(_parse_cron_field(args[0], 0, 59))
+                self.hours = sorted(_parse_cron_field(args[1], 0, 23))
+                self.month_days = _parse_cron_field(args[2], 1, 31)
+                self.months = _parse_cron_field(args[3], 1, 12)
+                # cron counts Sunday as 0 (or 7), Python as 6
+                self.cron_weekdays = {(value - 1) % 7 for value in _parse_cron_field(args[4], 0, 7)}
+            except ValueError as e:
+                raise ValueError(str(e) if "cron" in str(e) else f"bad cron field: {e}")
+            # As in cron, a field starting with * (such as */2) doesn't restrict the day
+            self.any_month_day = args[2].startswith("*")
+            self.any_weekday = args[4].startswith("*")
+            if self._next_cron(datetime.now()) is None:
+                raise ValueError("cron rule never fires (no such date)")
+        else:
+            raise ValueError(f"unknown reset rule {self.kind!r}")
+
+    def __str__(self):
+        return self.text
+
+    def next_after(self, after, default_time=(0, 0)):
+        """The first reset instant strictly after `after`, or None for never.
+
+        default_time is the daily reset time, used by daily rules without one.
+        """
+        if self.kind == "never":
+            return None
+        if self.kind == "daily":
+            return next_daily(after, *(self.time or default_time))
+        if self.kind == "every":
+            hour, minute = self.time or (0, 0)
+            candidate = (after + timedelta(days=self.days)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+            return candidate if candidate > after else candidate + timedelta(days=1)
+        if self.kind == "cron":
+            return self._next_cron(after)
+
+        hour, minute = self.time or ((23, 59) if self.kind == "month-end" else (0, 0))
+        day = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if self.kind == "weekly":
+            for offset in range(8):
+                candidate = day + timedelta(days=offset)
+                if candidate.weekday() in self.weekdays and candidate > after:
+                    return candidate
+        # monthly and month-end: this month's date if still ahead, else next month's
+        year, month = after.year, after.month
+        while True:
+            last_day = calendar.monthrange(year, month)[1]
+            month_day = last_day if self.kind == "month-end" else min(self.day, last_day)
+            candidate = datetime(year, month, month_day, hour, minute)
+            if candidate > after:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def _cron_day_matches(self, day):
+        in_month = day.day in self.month_days
+        on_weekday = day.weekday() in self.cron_weekdays
+        # As in cron: restricting both day fields means either one may match
+        if not self.any_month_day and not self.any_weekday:
+            return in_month or on_weekday
+        return in_month and on_weekday
+
+    def _next_cron(self, after):
+        day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(CRON_SEARCH_DAYS):
+            if day.month in self.months and self._cron_day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate > after:
+                            return candidate
+            day += timedelta(days=1)
+        return None
+
+class ResetScheduler:
+    """Fires each tab's reset at its deadline.
+
+    The next deadline of every tab with a rule sits in a heap and the
+    thread sleeps until the earliest one, so a tick only touches the tabs
+    that are due. Each overdue reset fires once, however many periods were
+    missed (app closed, machine suspended), and nothing runs or gets
+    written in between.
+    """
+
+    # Sleep in slices of at most this many seconds: the wait runs on the
+    # monotonic clock, which stops during suspend, so a long sleep could
+    # overshoot a wall-clock deadline after resume
+    MAX_WAIT = 300
+    # Seconds before resets that failed are tried again
+    RETRY_WAIT = 60
+
+    def __init__(self, get_rules, get_reset_time, last_runs, on_reset):
+        self.get_rules = get_rules            # () -> {tab: RecurrenceRule}
+        self.get_reset_time = get_reset_time  # () -> (hour, minute) of rules with the default daily time
+        self.last_runs = last_runs            # tab -> datetime of the last reset that ran
+        self.on_reset = on_reset              # ([tab, ...], when) -> None
+        self._heap = []
+        self._rules = {}
+        self._wake = threading.Event()
+        self._rebuild = True
+        self._stopped = False
+
+    def next_deadline(self, tab_name, after):
+        rule = self._rules.get(tab_name)
+        return rule.next_after(after, self.get_reset_time()) if rule is not None else None
+
+    def _build_heap(self):
+        self._rules = self.get_rules()
+        now = datetime.now()
+        self._heap = []
+        for tab_name in self._rules:
+            # A tab seen for the first time starts its schedule now
+            deadline = self.next_deadline(tab_name, self.last_runs.setdefault(tab_name, now))
+            if deadline is not None:
+                self._heap.append((deadline, tab_name))
+        heapq.heapify(self._heap)
+
+    def run_due(self, now):
+        """Fire every reset whose deadline has passed; returns the tabs that were reset"""
+        if self._rebuild:
+            self._rebuild = False
+            try:
+                self._build_heap()
+            except Exception:
+                self._rebuild = True
+                raise
+        popped = []
+        while self._heap and self._heap[0][0] <= now:
+            popped.append(heapq.heappop(self._heap))
+        due = [tab_name for _, tab_name in popped]
+        if due:
+            try:
+                self.on_reset(due, now)
+            except Exception:
+                # Still due: they run again on the next try
+                for entry in popped:
+                    heapq.heappush(self._heap, entry)
+                raise
+        # Only resets that ran move on to their next deadline
+        for tab_name in due:
+            self.last_runs[tab_name] = now
+            deadline = self.next_deadline(tab_name, now)
+            if deadline is not None:
+                heapq.heappush(self._heap, (deadline, tab_name))
+        return due
+
+    def reschedule(self):
+        """Recompute deadlines, e.g. after a rule, a tab or the daily reset time changed"""
+        self._rebuild = True
+        self._wake.set()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            now = datetime.now()
+            timeout = self.MAX_WAIT
+            try:
+                self.run_due(now)
+                if self._heap:
+                    timeout = min(timeout, max(0, (self._heap[0][0] - now).total_seconds()))
+            except Exception as e:
+                # A failed reset must not stop the scheduler: report it and try again shortly
+                print(f"kaizen: scheduled reset failed: {type(e).__name__}: {e}", file=sys.stderr)
+                timeout = self.RETRY_WAIT
+            self._wake.wait(timeout)
+            self._wake.clear()
@@ -0,0 +1,128 @@
+import copy
+import os
+import sys
+
+# tasks.json and task_states.json start with a schema version, so a current
+# store loads as-is and only older layouts go through the migrator:
+#
+#   tasks.json        {"schema_version": 1, "tabs": {tab: [{"id", "text"}, ...]}}
+#   task_states.json  {"schema_version": 1, "states": {tab: {task_id: state}}}
+#
+# Unversioned files are one of the layouts earlier versions wrote:
+#
+#   "v1"     {"daily": [task, ...], "custom": [task, ...]}
+#   "mixed"  {"daily": [task, ...], "custom": {tab: [task, ...]}, "completed": {tab: [task, ...]}}
+#   "tabs"   {tab: [task, ...]} (v2, 3b, 3c), where 3a tabs hold {"tasks": [...], "completed": [...]}
+#            instead of a list and 3c tasks may be {"id", "text"} objects
+SCHEMA_VERSION = 1
+
+# Tab names the layouts without tabs used for their built-in lists
+LEGACY_TAB_NAMES = {"daily": "Dailies", "custom": "Custom"}
+
+def is_current(raw, key):
+    """True if raw is a versioned document written by this schema version"""
+    if not isinstance(raw, dict) or "schema_version" not in raw:
+        return False
+    if raw["schema_version"] > SCHEMA_VERSION:
+        raise ValueError(f"Store was written by a newer version (schema {raw['schema_version']})")
+    return raw["schema_version"] == SCHEMA_VERSION and isinstance(raw.get(key), dict)
+
+def tasks_document(raw_tabs):
+    return {"schema_version": SCHEMA_VERSION, "tabs": raw_tabs}
+
+def states_document(task_states):
+    return {"schema_version": SCHEMA_VERSION, "states": task_states}
+
+def detect_layout(raw):
+    if not isinstance(raw, dict):
+        raise ValueError("tasks.json does not hold an object")
+    if "schema_version" in raw:
+        return "current"
+    if isinstance(raw.get("custom"), dict):
+        return "mixed"
+    if set(raw) == {"daily", "custom"} and all(isinstance(value, list) for value in raw.values()):
+        return "v1"
+    return "tabs"
+
+def tab_items(tab_name, value):
+    """(tasks, completed texts) of one tab in any of the tab layouts"""
+    if isinstance(value, dict) and isinstance(value.get("tasks"), list):
+        items, completed = value["tasks"], value.get("completed") or []
+    elif isinstance(value, list):
+        items, completed = value, []
+    else:
+        raise ValueError(f"Tab {tab_name!r} has an unrecognized layout")
+    for item in items:
+        if not isinstance(item, str) and not (isinstance(item, dict) and isinstance(item.get("text"), str)):
+            raise ValueError(f"Tab {tab_name!r} holds an unrecognized task: {item!r}")
+    return items, completed
+
+def normalize_tasks(raw):
+    """Convert any historical tasks.json layout in one pass.
+
+    Returns (layout, {tab: [task, ...]}, {tab: [completed task text, ...]}),
+    with tasks as plain strings or {"id", "text"} objects.
+    """
+    layout = detect_layout(raw)
+    tabs, completed = {}, {}
+
+    def add_tab(tab_name, value):
+        items, done = tab_items(tab_name, value)
+        if layout in ("v1", "mixed"):
+            tab_name = LEGACY_TAB_NAMES.get(tab_name, tab_name)
+        tabs.setdefault(tab_name, []).extend(items)
+        if done:
+            completed.setdefault(tab_name, []).extend(done)
+
+    if layout == "current":
+        if not isinstance(raw.get("tabs"), dict):
+            raise ValueError("tasks.json has a schema version but no tabs")
+        for tab_name, value in raw["tabs"].items():
+            add_tab(tab_name, value)
+    elif layout == "v1":
+        add_tab("daily", raw["daily"])
+        add_tab("custom", raw["custom"])
+    elif layout == "mixed":
+        add_tab("daily", raw.get("daily") or [])
+        for tab_name, value in raw["custom"].items():
+            add_tab(tab_name, value)
+        for tab_name, done in (raw.get("completed") or {}).items():
+            tab_name = LEGACY_TAB_NAMES.get(tab_name, tab_name)
+            if tab_name in tabs and isinstance(done, list):
+                completed.setdefault(tab_name, []).extend(done)
+    else:
+        for tab_name, value in raw.items():
+            add_tab(tab_name, value)
+    return layout, tabs, completed
+
+def states_mapping(raw):
+    """The {tab: ...} or flat {"tab:task": ...} mapping inside task_states.json, whatever its version"""
+    if isinstance(raw, dict) and "schema_version" in raw:
+        return raw.get("states") or {}
+    return raw if isinstance(raw, dict) else {}
+
+def upgrade_settings(settings, default_settings, tab_names):
+    """Fill settings keys older versions didn't write and list every tab in tab_order"""
+    for key, value in default_settings.items():
+        if key not in settings and key != "tab_order":
+            settings[key] = copy.deepcopy(value)
+    tab_order = [tab_name for tab_name in settings.get("tab_order", []) if tab_name in tab_names]
+    tab_order += [tab_name for tab_name in tab_names if tab_name not in tab_order]
+    settings["tab_order"] = tab_order
+    return settings
+
+if __name__ == "__main__":
+    # python kaizen_schema.py [data_dir ...] upgrades each directory's JSON store in place
+    from kaizen_storage import JsonStorage, load_json
+    for data_dir in sys.argv[1:] or ["."]:
+        paths = [os.path.join(data_dir, name)
+                 for name in ("tasks.json", "task_states.json", "settings.json", "tasks.journal")]
+        if not os.path.exists(paths[0]):
+            print(f"{data_dir}: no tasks.json")
+            continue
+        layout = detect_layout(load_json(paths[0], {}))
+        storage = JsonStorage(*paths)
+        tasks, task_states, _ = storage.load({}, {})
+        storage.journal.close()
+        print(f"{data_dir}: {layout} layout, {len(tasks)} tabs, {sum(len(t) for t in tasks.values())} tasks"
+              + ("" if layout == "current" else " (upgraded)"))
@@ -0,0 +1,195 @@
+import re
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"\w+")
+
+# A prefix covering more tokens than this is matched by checking each of a
+# tab's tasks instead of gathering the tasks of every token it covers
+PREFIX_TOKEN_LIMIT = 200
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+class SearchIndex:
+    """In-memory inverted index over task text, across all tabs.
+
+    Each token maps, per tab, to the ids of the tasks holding it, and the
+    tokens themselves are kept sorted so a prefix ("rep" for "report") is
+    a bisect away. Every task also carries a sequence number in display
+    order, so results come back in the order the tabs show them, and a
+    search across tabs stops as soon as it has enough. apply() keeps the
+    index current one store operation at a time.
+    """
+
+    def __init__(self, tasks=None):
+        self.postings = {}    # token -> {tab: {task_id, ...}}
+        self.vocabulary = []  # every token in postings, sorted
+        self.docs = {}        # tab -> {task_id: (sequence, tokens, " token token ...")}
+        self.generation = 0   # bumped on every change, so views know to re-run their query
+        self._sequence = 0
+        new_tokens = []
+        for tab_name, task_list in (tasks or {}).items():
+            self.docs.setdefault(tab_name, {})
+            for task_id, text in task_list.items():
+                new_tokens += self._add(tab_name, task_id, text)
+        self._extend_vocabulary(new_tokens)
+
+    def __len__(self):
+        return sum(len(tab_docs) for tab_docs in self.docs.values())
+
+    def _add(self, tab_name, task_id, text):
+        """Index a task and return the tokens that are new to the index"""
+        tab_docs = self.docs.setdefault(tab_name, {})
+        if task_id in tab_docs:
+            # A renamed task keeps its place
+            sequence = tab_docs[task_id][0]
+            self.remove(tab_name, task_id)
+        else:
+            self._sequence += 1
+            sequence = self._sequence
+        tokens = tuple(set(tokenize(text)))
+        # The joined tokens let a prefix be checked with one substring search
+        tab_docs[task_id] = (sequence, tokens, " " + " ".join(tokens))
+        new_tokens = []
+        for token in tokens:
+            by_tab = self.postings.get(token)
+            if by_tab is None:
+                by_tab = self.postings[token] = {}
+                new_tokens.append(token)
+            ids = by_tab.get(tab_name)
+            if ids is None:
+                ids = by_tab[tab_name] = set()
+            ids.add(task_id)
+        self.generation += 1
+        return new_tokens
+
+    def _extend_vocabulary(self, new_tokens):
+        if len(new_tokens) <= 8:
+            for token in new_tokens:
+                insort(self.vocabulary, token)
+        else:
+            # Sorting a sorted list plus one new run is a linear merge
+            self.vocabulary = sorted(self.vocabulary + sorted(new_tokens))
+
+    def add(self, tab_name, task_id, text):
+        self._extend_vocabulary(self._add(tab_name, task_id, text))
+
+    def remove(self, tab_name, task_id):
+        entry = self.docs.get(tab_name, {}).pop(task_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            by_tab = self.postings[token]
+            ids = by_tab[tab_name]
+            ids.discard(task_id)
+            if not ids:
+                del by_tab[tab_name]
+                if not by_tab:
+                    del self.postings[token]
+                    del self.vocabulary[bisect_left(self.vocabulary, token)]
+        self.generation += 1
+
+    def add_tab(self, tab_name, task_list):
+        self.docs.setdefault(tab_name, {})
+        new_tokens = []
+        for task_id, text in task_list.items():
+            new_tokens += self._add(tab_name, task_id, text)
+        self._extend_vocabulary(new_tokens)
+
+    def remove_tab(self, tab_name):
+        for task_id in list(self.docs.get(tab_name, ())):
+            self.remove(tab_name, task_id)
+        self.docs.pop(tab_name, None)
+        self.generation += 1
+
+    def reindex_tab(self, tab_name, task_list):
+        """Bring one tab up to date wholesale, e.g. after it was replaced"""
+        self.remove_tab(tab_name)
+        if task_list is not None:
+            self.add_tab(tab_name, task_list)
+
+    def apply(self, op, tasks):
+        """Follow a store operation that apply_op has already applied to tasks"""
+        kind = op["op"]
+        tab_name = op.get("tab")
+        if kind == "delete_tab":
+            self.remove_tab(tab_name)
+        elif kind == "rename_tab":
+            self.remove_tab(tab_name)
+            self.reindex_tab(op["new_tab"], tasks.get(op["new_tab"]))
+        elif kind in ("add_task", "rename_task"):
+            text = tasks[tab_name].text_of(op["id"]) if tab_name in tasks else None
+            if text is not None:
+                self.add(tab_name, op["id"], text)
+        elif kind == "delete_task":
+            self.remove(tab_name, op["id"])
+        elif kind == "set_tasks":
+            self.reindex_tab(tab_name, tasks.get(tab_name))
+
+    def _parse(self, query):
+        """(exact words, prefix tokens or None, prefix) of a query; None if nothing can match"""
+        words = tokenize(query)
+        if not words:
+            return None
+        # While typing, the last word is usually unfinished
+        if query[-1:].isspace():
+            return set(words), None, None
+        exact, prefix = set(words[:-1]), words[-1]
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_left(self.vocabulary, prefix + "\U0010ffff", start)
+        if start == end:
+            return None
+        # Only a narrow prefix is worth expanding into its tokens
+        prefix_tokens = self.vocabulary[start:end] if end - start <= PREFIX_TOKEN_LIMIT else None
+        return exact, prefix_tokens, prefix
+
+    def _tab_matches(self, tab_name, exact, prefix_tokens, prefix):
+        """Ids in one tab matching the parsed query, in display order"""
+        tab_docs = self.docs.get(tab_name)
+        if not tab_docs:
+            return []
+        candidates = None
+        for word in sorted(exact, key=lambda word: len(self.postings.get(word, {}).get(tab_name, ()))):
+            ids = self.postings.get(word, {}).get(tab_name)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if prefix is not None:
+            needle = " " + prefix
+            if candidates is not None and len(candidates) <= PREFIX_TOKEN_LIMIT:
+                # Cheapest to check the few candidates directly
+                candidates = [task_id for task_id in candidates if needle in tab_docs[task_id][2]]
+            elif prefix_tokens is not None:
+                with_prefix = set()
+                for token in prefix_tokens:
+                    with_prefix |= self.postings[token].get(tab_name, set())
+                candidates = with_prefix if candidates is None else candidates & with_prefix
+            else:
+                # A short prefix covers most tokens: check each task in the tab
+                candidates = [task_id for task_id in (tab_docs if candidates is None else candidates)
+                              if needle in tab_docs[task_id][2]]
+        return sorted(candidates, key=lambda task_id: tab_docs[task_id][0])
+
+    def search(self, query, tab_name=None, tab_order=None, limit=None):
+        """[(tab, task_id)] matching every word of query (the last one as a prefix).
+
+        Results follow tab_order, then display order within each tab; with
+        a limit, tabs are searched in order only until enough are found.
+        """
+        parsed = self._parse(query)
+        if parsed is None:
+            return []
+        if tab_name is not None:
+            tab_names = [tab_name]
+        else:
+            tab_names = [name for name in tab_order or () if name in self.docs]
+            listed = set(tab_names)
+            tab_names += [name for name in self.docs if name not in listed]
+        results = []
+        for name in tab_names:
+            results += [(name, task_id) for task_id in self._tab_matches(name, *parsed)]
+            if limit is not None and len(results) >= limit:
+                return results[:limit]
+        return results
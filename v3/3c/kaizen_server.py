@@ -0,0 +1,361 @@
+"""Local HTTP/JSON API over one Kaizen store, so several clients can share it.
+
+    python kaizen_server.py [--port 8765] [--data-dir .]
+
+    GET    /tabs                          tabs with task and done counts
+    GET    /tabs/<tab>/tasks[?first=&last=]
+    POST   /tabs                          {"name": tab}
+    DELETE /tabs/<tab>
+    POST   /tabs/<tab>/tasks              {"text": task} or {"texts": [...]}
+    DELETE /tabs/<tab>/tasks/<id>
+    POST   /tabs/<tab>/tasks/<id>/toggle
+    POST   /reset                         {} for every tab, or {"tab": tab}
+    POST   /batch                         {"actions": [{"action": "add_task", "tab": ..., "text": ...}, ...]}
+    GET    /stats[?tab=&by=week|month]    completion rates and streaks, or rollups with by=
+
+Every write, whichever endpoint it came in on, becomes a list of actions
+for the store owner, which applies everything queued in one step under the
+store lock. Connections are HTTP/1.1 keep-alive.
+"""
+import argparse
+import asyncio
+import json
+import signal
+from datetime import date, timedelta
+from urllib.parse import parse_qs, unquote, urlsplit
+from kaizen_core import KaizenStore
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 16 * 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 30  # seconds an idle connection stays open
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class StoreOwner:
+    """The single writer: applies queued action lists to the store in arrival order"""
+
+    def __init__(self, store):
+        self.store = store
+        self.queue = asyncio.Queue()
+
+    async def submit(self, actions):
+        """Apply a list of actions and return one result dict per action"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((actions, future))
+        return await future
+
+    async def run(self):
+        while True:
+            pending = [await self.queue.get()]
+            # Everything that queued up meanwhile is applied under one lock acquisition
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            with self.store.lock:
+                for actions, future in pending:
+                    # Every request gets an answer, or it and all later writes would wait forever
+                    try:
+                        results = [self.apply(action) for action in actions]
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    if not future.done():
+                        future.set_result(results)
+
+    def apply(self, action):
+        """Run one action; a bad action gets an error result without affecting the others"""
+        try:
+            if not isinstance(action, dict):
+                raise ValueError("action must be an object")
+            handler = getattr(self, "do_" + str(action.get("action")), None)
+            if handler is None:
+                raise ValueError(f"unknown action {action.get('action')!r}")
+            return dict(handler(action), ok=True)
+        except KeyError as e:
+            return {"ok": False, "error": f"missing field {e}"}
+        except (TypeError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def _name(self, action, field):
+        """A tab name given in field, which must be a string"""
+        name = action[field]
+        if not isinstance(name, str):
+            raise ValueError(f"{field} must be a string")
+        return name
+
+    def _tab(self, action):
+        tab_name = self._name(action, "tab")
+        if tab_name not in self.store.tasks:
+            raise ValueError(f"no tab named {tab_name!r}")
+        return tab_name
+
+    def _strings(self, action, many, one):
+        """The list of strings in field many, or the single string in field one"""
+        if many in action:
+            values = action[many]
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError(f"{many} must be a list of strings")
+            return values
+        if not isinstance(action[one], str):
+            raise ValueError(f"{one} must be a string")
+        return [action[one]]
+
+    def _ids(self, action, tab_name):
+        """Task ids named by "id"/"ids" or, failing that, by "task"/"tasks" text"""
+        if "ids" in action or "id" in action:
+            return self._strings(action, "ids", "id")
+        texts = self._strings(action, "tasks", "task")
+        task_list = self.store.tasks[tab_name]
+        return [task_list.id_of(text) for text in texts if task_list.id_of(text) is not None]
+
+    def do_add_tab(self, action):
+        return {"created": self.store.add_tab(self._name(action, "name"))}
+
+    def do_delete_tab(self, action):
+        return {"deleted": self.store.delete_tab(self._name(action, "tab"))}
+
+    def do_add_task(self, action):
+        texts = self._strings(action, "texts", "text")
+        return {"ids": self.store.add_tasks(self._name(action, "tab"), texts)}
+
+    def do_delete_task(self, action):
+        tab_name = self._tab(action)
+        return {"deleted": self.store.delete_tasks(tab_name, self._ids(action, tab_name))}
+
+    def do_mark_done(self, action):
+        tab_name = self._tab(action)
+        return {"changed": self.store.toggle_tasks(tab_name, self._ids(action, tab_name))}
+
+    def do_set_completed(self, action):
+        tab_name = self._tab(action)
+        if not isinstance(action["completed"], bool):
+            raise ValueError("completed must be true or false")
+        return {"changed": self.store.set_completed(tab_name, self._ids(action, tab_name), action["completed"])}
+
+    def do_move_tasks(self, action):
+        tab_name = self._tab(action)
+        return {"moved": self.store.move_tasks(tab_name, self._ids(action, tab_name),
+                                                 self._name(action, "to"))}
+
+    def do_reset_all_tasks(self, action):
+        self.store.reset_all()
+        return {}
+
+    def do_reset_tab(self, action):
+        self.store.reset_tab(self._tab(action))
+        return {}
+
+    def do_set_reset_rule(self, action):
+        tab_name = self._tab(action)
+        if not isinstance(action.get("rule"), (str, type(None))):
+            raise ValueError("rule must be a string")
+        self.store.set_reset_rule(tab_name, action.get("rule"))
+        rule = self.store.reset_rule(tab_name)
+        return {"rule": str(rule) if rule is not None else "never"}
+
+    def do_undo(self, action):
+        result = self.store.undo()
+        return {"undone": result[0] if result else None}
+
+    def do_redo(self, action):
+        result = self.store.redo()
+        return {"redone": result[0] if result else None}
+
+class KaizenServer:
+    def __init__(self, store):
+        self.store = store
+        self.owner = StoreOwner(store)
+
+    def list_tabs(self):
+        with self.store.lock:
+            return [{"name": tab_name, "tasks": len(self.store.tasks[tab_name]),
+                     "done": sum(1 for state in self.store.task_states.get(tab_name, {}).values()
+                                 if state["completed"])}
+                    for tab_name in self.store.tab_names()]
+
+    def list_tasks(self, tab_name, query):
+        if tab_name not in self.store.tasks:
+            raise ApiError(404, f"no tab named {tab_name!r}")
+        try:
+            first = int(query.get("first", ["0"])[0])
+            last = int(query["last"][0]) if "last" in query else None
+        except ValueError:
+            raise ApiError(400, "first and last must be integers")
+        return [{"id": task_id, "text": text, "completed": completed}
+                for task_id, text, completed in self.store.rows(tab_name, first, last)]
+
+    def stats(self, query):
+        tab_name = query.get("tab", [None])[0]
+        by = query.get("by", [None])[0]
+        if tab_name is not None and tab_name not in self.store.tasks:
+            raise ApiError(404, f"no tab named {tab_name!r}")
+        if by not in (None, "week", "month"):
+            raise ApiError(400, "by must be week or month")
+        stats = self.store.stats()
+        if by is not None:
+            return [{"period": label, "completions": count} for label, count in stats.rollup(tab_name, by)]
+        today = date.today()
+        result = []
+        for name in [tab_name] if tab_name else self.store.tab_names():
+            task_count = len(self.store.tasks.get(name, ()))
+            result.append({
+                "tab": name,
+                "rates": {str(days): stats.completion_rate(name, task_count, today - timedelta(days=days - 1), today)
+                          for days in (7, 30, 365)},
+                "tasks": [{"id": task_id, "text": text, "completions": completions, "streak": current,
+                           "best_streak": longest}
+                          for task_id, text, completions, current, longest in stats.task_summary(name, today)]})
+        return result
+
+    async def route(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["tabs"]:
+            if method == "GET":
+                return self.list_tabs()
+            if method == "POST":
+                return (await self.owner.submit([dict(body, action="add_tab")]))[0]
+        elif len(parts) == 2 and parts[0] == "tabs":
+            if method == "DELETE":
+                return (await self.owner.submit([{"action": "delete_tab", "tab": parts[1]}]))[0]
+        elif len(parts) == 3 and parts[0] == "tabs" and parts[2] == "tasks":
+            if method == "GET":
+                return self.list_tasks(parts[1], query)
+            if method == "POST":
+                return (await self.owner.submit([dict(body, action="add_task", tab=parts[1])]))[0]
+        elif len(parts) == 4 and parts[0] == "tabs" and parts[2] == "tasks":
+            if method == "DELETE":
+                return (await self.owner.submit([{"action": "delete_task", "tab": parts[1], "id": parts[3]}]))[0]
+        elif len(parts) == 5 and parts[0] == "tabs" and parts[2] == "tasks" and parts[4] == "toggle":
+            if method == "POST":
+                return (await self.owner.submit([{"action": "mark_done", "tab": parts[1], "id": parts[3]}]))[0]
+        elif parts == ["reset"]:
+            if method == "POST":
+                action = {"action": "reset_tab", "tab": body["tab"]} if "tab" in body else {"action": "reset_all_tasks"}
+                return (await self.owner.submit([action]))[0]
+        elif parts == ["stats"]:
+            if method == "GET":
+                return self.stats(query)
+        elif parts == ["batch"]:
+            if method == "POST":
+                actions = body.get("actions")
+                if not isinstance(actions, list):
+                    raise ApiError(400, "batch needs an \"actions\" list")
+                return {"results": await self.owner.submit(actions)}
+        else:
+            raise ApiError(404, f"no such endpoint: {path}")
+        raise ApiError(405, f"{method} is not supported on {path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                try:
+                    keep_alive = await self.handle_request(head, reader, writer)
+                    await writer.drain()
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def handle_request(self, head, reader, writer):
+        """Read one request's body, answer it, and say whether the connection stays open"""
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            self.respond(writer, 400, {"error": "malformed request line"}, False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+        try:
+            length = int(headers.get("content-length", "0"))
+            if length > MAX_BODY_SIZE:
+                raise ApiError(413, "request body too large")
+            raw_body = await reader.readexactly(length) if length else b""
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise ApiError(400, "body is not valid JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "body must be a JSON object")
+            url = urlsplit(target)
+            status, result = 200, await self.route(method, url.path, parse_qs(url.query), body)
+        except ApiError as e:
+            status, result = e.status, {"error": str(e)}
+            # The unread body of an oversized request would be parsed as the next request
+            keep_alive = keep_alive and status != 413
+        except ValueError:
+            status, result, keep_alive = 400, {"error": "bad Content-Length"}, False
+        except Exception as e:
+            status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+        self.respond(writer, status, result, keep_alive)
+        return keep_alive
+
+    def respond(self, writer, status, result, keep_alive):
+        payload = json.dumps(result).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload)
+
+    async def serve(self, host, port):
+        """Serve until SIGINT or SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C still arrives as KeyboardInterrupt
+                pass
+        owner_task = asyncio.create_task(self.owner.run())
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE,
+                                            backlog=1024)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            owner_task.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a Kaizen task store over HTTP/JSON on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-d", "--data-dir", default=".")
+    args = parser.parse_args(argv)
+
+    store = KaizenStore.open(args.data_dir)
+    # Scheduled resets keep running while the server owns the store
+    scheduler = store.reset_scheduler()
+    scheduler.start()
+    print(f"Serving {args.data_dir} on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(KaizenServer(store).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        store.close()
+
+if __name__ == "__main__":
+    main()
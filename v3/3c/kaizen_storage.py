@@ -0,0 +1,828 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from itertools import islice
+from kaizen_schema import is_current, normalize_tasks, states_document, states_mapping, tasks_document
+
+# Every full save also leaves a checksummed copy in snapshots/, keeping the newest few per file
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_KEEP = 5
+SNAPSHOT_HEADER = "KAIZEN-SNAPSHOT sha256="
+
+def load_json(file, default):
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # Keep the damaged file for inspection and fall back to the newest good snapshot
+        os.replace(file, f"{file}.corrupt")
+        recovered = load_latest_snapshot(file)
+        if recovered is None:
+            return default
+        # Put the file back right away; otherwise the next start would find it missing and load the defaults
+        write_atomic(file, json.dumps(recovered, indent=4))
+        return recovered
+
+def save_json(file, data):
+    text = json.dumps(data, indent=4)
+    write_atomic(file, text)
+    save_snapshot(file, text)
+
+def write_atomic(file, text):
+    """Replace file with text (or bytes) so that a crash leaves either the old or the new contents, never a mix"""
+    directory = os.path.dirname(file) or "."
+    # A temp file of its own, so two processes saving at once can't write into the same one
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(file) + ".", suffix=".tmp", dir=directory)
+    try:
+        with open(fd, "wb") as f:
+            f.write(text.encode("utf-8") if isinstance(text, str) else text)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp makes the file private; keep the permissions the file had
+        try:
+            os.chmod(tmp_file, os.stat(file).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_file, 0o644)
+        os.replace(tmp_file, file)
+    except BaseException:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
+    fsync_dir(directory)
+
+def fsync_dir(path):
+    """Make a rename in path durable (a no-op where directories can't be opened, e.g. Windows)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def snapshot_paths(file):
+    """Snapshots of file, oldest first"""
+    snapshot_dir = os.path.join(os.path.dirname(file), SNAPSHOT_DIR)
+    prefix = os.path.basename(file) + "."
+    try:
+        names = sorted(name for name in os.listdir(snapshot_dir)
+                       if name.startswith(prefix) and name.endswith(".snap"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(snapshot_dir, name) for name in names]
+
+def save_snapshot(file, text):
+    """Write a checksummed copy of file's new contents and drop all but the newest SNAPSHOT_KEEP"""
+    snapshot_dir = os.path.join(os.path.dirname(file), SNAPSHOT_DIR)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    name = f"{os.path.basename(file)}.{time.time_ns():020d}.snap"
+    write_atomic(os.path.join(snapshot_dir, name), f"{SNAPSHOT_HEADER}{digest}\n{text}")
+    for old_path in snapshot_paths(file)[:-SNAPSHOT_KEEP]:
+        os.remove(old_path)
+
+def read_snapshot(path):
+    """Parsed contents of a snapshot, or None if it is truncated or fails its checksum"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            text = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not header.startswith(SNAPSHOT_HEADER):
+        return None
+    if hashlib.sha256(text.encode("utf-8")).hexdigest() != header[len(SNAPSHOT_HEADER):].strip():
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+def load_latest_snapshot(file):
+    """Contents of the newest snapshot of file that verifies, or None"""
+    for path in reversed(snapshot_paths(file)):
+        data = read_snapshot(path)
+        if data is not None:
+            return data
+    return None
+
+def new_task_id():
+    return f"{random.getrandbits(48):012x}"
+
+class TaskList:
+    """Ordered tasks of one tab, indexed both by stable task id and by text.
+
+    Membership, insertion, removal and renames are O(1); iteration yields
+    task texts in display order, so `task in tasks[tab]` and
+    `for task in tasks[tab]` read the same as they did with plain lists.
+    """
+
+    def __init__(self, items=()):
+        self._by_id = {}    # id -> text, in display order
+        self._by_text = {}  # text -> id
+        self._order = []    # id by position; rebuilt lazily after removals
+        for item in items:
+            if isinstance(item, str):
+                self.add(item)
+            else:
+                self.add(item["text"], item.get("id"))
+
+    @classmethod
+    def from_columns(cls, ids, texts):
+        """Build a list from parallel id and text sequences in one pass"""
+        task_list = cls()
+        task_list._by_id = dict(zip(ids, texts))
+        task_list._by_text = dict(zip(texts, ids))
+        if len(task_list._by_id) != len(ids) or len(task_list._by_text) != len(ids):
+            # Duplicate ids or texts: fall back to add(), which resolves them
+            return cls({"id": task_id, "text": text} for task_id, text in zip(ids, texts))
+        task_list._order = list(ids)
+        return task_list
+
+    def add(self, text, task_id=None, index=None):
+        """Append a task (or insert it at display position index) and return its id; an existing text keeps its id"""
+        if text in self._by_text:
+            return self._by_text[text]
+        while task_id is None or task_id in self._by_id:
+            task_id = new_task_id()
+        self._by_text[text] = task_id
+        if index is not None and index < len(self._by_id):
+            # Inserting rebuilds the dict, O(n); appends stay O(1)
+            items = iter(self._by_id.items())
+            by_id = dict(islice(items, index))
+            by_id[task_id] = text
+            by_id.update(items)
+            self._by_id = by_id
+            self._order = None
+            return task_id
+        self._by_id[task_id] = text
+        if self._order is not None:
+            self._order.append(task_id)
+        return task_id
+
+    def remove(self, task_id):
+        text = self._by_id.pop(task_id, None)
+        if text is not None:
+            del self._by_text[text]
+            self._order = None
+
+    def rename(self, task_id, text):
+        if task_id in self._by_id and text not in self._by_text:
+            del self._by_text[self._by_id[task_id]]
+            self._by_id[task_id] = text
+            self._by_text[text] = task_id
+
+    def id_of(self, text):
+        return self._by_text.get(text)
+
+    def text_of(self, task_id):
+        return self._by_id.get(task_id)
+
+    def has_id(self, task_id):
+        return task_id in self._by_id
+
+    def _ordered_ids(self):
+        if self._order is None:
+            self._order = list(self._by_id)
+        return self._order
+
+    def id_at(self, index):
+        return self._ordered_ids()[index]
+
+    def ids_between(self, first, last):
+        """Ids of the tasks displayed at positions first..last-1"""
+        return self._ordered_ids()[first:last]
+
+    def index_of(self, task_id):
+        """Display position of a task (a linear scan; prefer id lookups)"""
+        if task_id not in self._by_id:
+            return None
+        return self._ordered_ids().index(task_id)
+
+    def ids(self):
+        return self._by_id.keys()
+
+    def items(self):
+        return self._by_id.items()
+
+    def to_json(self):
+        return [{"id": task_id, "text": text} for task_id, text in self._by_id.items()]
+
+    def __contains__(self, text):
+        return text in self._by_text
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+def tasks_from_json(raw_tasks):
+    """Build {tab: TaskList} from tasks.json, whose tabs hold plain strings or {"id", "text"} items"""
+    return {tab_name: TaskList(task_list) for tab_name, task_list in raw_tasks.items()}
+
+def tasks_to_json(tasks):
+    return {tab_name: task_list.to_json() for tab_name, task_list in tasks.items()}
+
+def upgrade_task_states(raw_states, tasks):
+    """Convert task states to the nested {tab: {task_id: state}} layout.
+
+    Older files keep one flat dict keyed "tab:task". Since both tab and task
+    names may contain ':', each key is split at the first colon that yields a
+    known tab (preferring one that also holds the task). States still keyed
+    by task text are then re-keyed by task id.
+    """
+    nested = {}
+    for key, value in raw_states.items():
+        if not isinstance(value.get("completed"), bool):
+            # Already nested: key is a tab name
+            nested.setdefault(key, {}).update(value)
+            continue
+        split = None
+        start = key.find(":")
+        while start != -1:
+            tab_name, task = key[:start], key[start + 1:]
+            if tab_name in tasks:
+                if task in tasks[tab_name]:
+                    split = (tab_name, task)
+                    break
+                if split is None:
+                    split = (tab_name, task)
+            start = key.find(":", start + 1)
+        if split is None:
+            tab_name, _, task = key.partition(":")
+            split = (tab_name, task)
+        nested.setdefault(split[0], {})[split[1]] = value
+
+    for tab_name, tab_states in nested.items():
+        task_list = tasks.get(tab_name)
+        if task_list is None:
+            continue
+        for key in list(tab_states):
+            if not task_list.has_id(key) and task_list.id_of(key) is not None:
+                tab_states[task_list.id_of(key)] = tab_states.pop(key)
+    return nested
+
+def migrate_store(raw_tasks, raw_task_states):
+    """Build tasks and task_states from any historical layout of tasks.json and task_states.json"""
+    _, raw_tabs, completed = normalize_tasks(raw_tasks)
+    tasks = tasks_from_json(raw_tabs)
+    task_states = upgrade_task_states(states_mapping(raw_task_states), tasks)
+    # Layouts that kept completed tasks as a list of texts carry no completion date
+    for tab_name, texts in completed.items():
+        for text in texts:
+            task_id = tasks[tab_name].id_of(text)
+            if task_id is not None:
+                task_states.setdefault(tab_name, {}).setdefault(task_id, {"completed": True, "date_completed": None})
+    return tasks, task_states
+
+def resolve_task_id(task_list, op):
+    """Task id an operation refers to; journal entries from before ids existed carry only the text"""
+    if op.get("id") is not None:
+        return op["id"]
+    return task_list.id_of(op["task"]) if task_list is not None else None
+
+def apply_op(tasks, task_states, op):
+    """Apply one store operation to the in-memory tasks and task_states dicts.
+
+    tasks maps each tab to a TaskList and task_states is nested by tab and
+    task id ({tab: {task_id: state}}), so clearing or renaming a whole tab
+    is a single dict operation.
+
+    Every operation describes an absolute result (a toggle is recorded as the
+    state it produced), so replaying the journal over a snapshot that already
+    contains some of its operations gives the same store. Ids resolved or
+    assigned here are written back into op, so the persisted operation
+    replays with the same ids.
+    """
+    kind = op["op"]
+    tab_name = op.get("tab")
+
+    if kind == "add_tab":
+        tasks.setdefault(tab_name, TaskList())
+    elif kind == "delete_tab":
+        tasks.pop(tab_name, None)
+        task_states.pop(tab_name, None)
+    elif kind == "rename_tab":
+        if tab_name in tasks and op["new_tab"] not in tasks:
+            tasks[op["new_tab"]] = tasks.pop(tab_name)
+            if tab_name in task_states:
+                task_states[op["new_tab"]] = task_states.pop(tab_name)
+    elif kind == "add_task":
+        # "index" puts the task back where it was, e.g. when a deletion is undone
+        op["id"] = tasks.setdefault(tab_name, TaskList()).add(op["task"], op.get("id"), op.get("index"))
+    elif kind == "delete_task":
+        op["id"] = resolve_task_id(tasks.get(tab_name), op)
+        if tab_name in tasks:
+            tasks[tab_name].remove(op["id"])
+        task_states.get(tab_name, {}).pop(op["id"], None)
+    elif kind == "rename_task":
+        if tab_name in tasks:
+            tasks[tab_name].rename(op["id"], op["task"])
+    elif kind == "set_tasks":
+        old_list = tasks.get(tab_name, TaskList())
+        items = [{"id": old_list.id_of(item) or new_task_id(), "text": item} if isinstance(item, str) else item
+                 for item in op["tasks"]]
+        new_list = TaskList.from_columns([item["id"] for item in items], [item["text"] for item in items])
+        op["tasks"] = new_list.to_json()
+        # Tasks dropped from the tab lose their completion state
+        tab_states = task_states.get(tab_name)
+        if tab_states:
+            for task_id in list(tab_states):
+                if not new_list.has_id(task_id):
+                    del tab_states[task_id]
+        tasks[tab_name] = new_list
+    elif kind == "set_state":
+        op["id"] = resolve_task_id(tasks.get(tab_name), op)
+        if op["id"] is None:
+            pass
+        elif op["state"] is None:
+            task_states.get(tab_name, {}).pop(op["id"], None)
+        else:
+            task_states.setdefault(tab_name, {})[op["id"]] = dict(op["state"])
+    elif kind == "clear_states":
+        if tab_name is None:
+            task_states.clear()
+        else:
+            task_states.pop(tab_name, None)
+    else:
+        raise ValueError(f"Unknown store operation: {kind}")
+
+class Journal:
+    """Append-only log of store operations, one JSON line per mutation.
+
+    Each append is flushed and fsync'd, so a mutation costs one short write
+    no matter how large tasks.json has grown. The owner folds the journal
+    back into the JSON files with save_all() and truncate().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, op):
+        self.append_many([op])
+
+    def append_many(self, ops):
+        """Append a batch of operations with a single write and fsync"""
+        lines = "".join(json.dumps(op, separators=(",", ":")) + "\n" for op in ops)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a+", encoding="utf-8")
+                # Terminate a torn line left by a crash so this entry starts on its own line
+                if self._file.tell() > 0:
+                    self._file.seek(self._file.tell() - 1)
+                    if self._file.read(1) != "\n":
+                        self._file.write("\n")
+            self._file.write(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.count += len(ops)
+
+    def replay(self, tasks, task_states):
+        """Apply every journal entry to the stores and return how many were applied"""
+        applied = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn line from a crash mid-append; that mutation never completed
+                        continue
+                    if "op" not in op:
+                        # The {"base": seq} header of a shared journal
+                        continue
+                    apply_op(tasks, task_states, op)
+                    applied += 1
+        except FileNotFoundError:
+            pass
+        self.count = applied
+        return applied
+
+    def truncate(self):
+        """Drop all entries once they have been folded into a snapshot"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.count = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class JsonStorage:
+    """Store backed by tasks.json, task_states.json and settings.json plus the journal"""
+
+    # Fold the journal into the JSON files once it holds this many operations,
+    # or as many operations as there are tasks if that is larger, so
+    # compaction stays amortized O(1) per mutation
+    COMPACT_MIN = 1000
+
+    def __init__(self, tasks_file, states_file, settings_file, journal_file):
+        self.tasks_file = tasks_file
+        self.states_file = states_file
+        self.settings_file = settings_file
+        self.journal = Journal(journal_file)
+        self.needs_upgrade = False
+
+    def load(self, default_tasks, default_settings):
+        tasks, task_states = self.load_stores(default_tasks)
+        settings = load_json(self.settings_file, default_settings)
+        # Replay operations that were journaled after the last compaction.
+        # A first run or an older layout also saves straight away, so the
+        # default tasks keep their ids and the migration never runs twice.
+        if self.journal.replay(tasks, task_states) or self.needs_upgrade:
+            self.needs_upgrade = False
+            self.save_all(tasks, task_states)
+        return tasks, task_states, settings
+
+    def load_stores(self, default_tasks):
+        """tasks and task_states as of the last full save, before journal replay"""
+        raw_tasks = load_json(self.tasks_file, None)
+        raw_task_states = load_json(self.states_file, None)
+        if is_current(raw_tasks, "tabs") and is_current(raw_task_states, "states"):
+            return tasks_from_json(raw_tasks["tabs"]), raw_task_states["states"]
+        self.needs_upgrade = True
+        return migrate_store(default_tasks if raw_tasks is None else raw_tasks, raw_task_states)
+
+    def record(self, op):
+        self.journal.append(op)
+
+    def record_many(self, ops):
+        self.journal.append_many(ops)
+
+    def needs_compaction(self, tasks):
+        if self.journal.count < self.COMPACT_MIN:
+            return False
+        return self.journal.count >= sum(len(task_list) for task_list in tasks.values())
+
+    def save_all(self, tasks, task_states):
+        """Write full snapshots of both stores and start a fresh journal"""
+        save_json(self.tasks_file, tasks_document(tasks_to_json(tasks)))
+        save_json(self.states_file, states_document(task_states))
+        self.journal.truncate()
+
+    def save_settings(self, settings):
+        save_json(self.settings_file, settings)
+
+    def close(self, tasks, task_states):
+        self.save_all(tasks, task_states)
+        self.journal.close()
+
+SQLITE_SCHEMA_VERSION = 1
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tabs (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    tab TEXT NOT NULL REFERENCES tabs(name) ON DELETE CASCADE ON UPDATE CASCADE,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (tab, id)
+);
+CREATE INDEX IF NOT EXISTS tasks_by_position ON tasks(tab, position);
+CREATE INDEX IF NOT EXISTS tasks_by_text ON tasks(tab, text);
+CREATE TABLE IF NOT EXISTS task_states (
+    tab TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    date_completed TEXT,
+    PRIMARY KEY (tab, task_id),
+    FOREIGN KEY (tab, task_id) REFERENCES tasks(tab, id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class SqliteStorage:
+    """Store backed by a single SQLite database in WAL mode.
+
+    Every operation maps to one or two indexed statements in its own
+    transaction, so nothing is ever rewritten wholesale.
+    """
+
+    def __init__(self, db_file):
+        import sqlite3  # Only SQLite stores pay for loading it
+        self.db_file = db_file
+        # The reset thread records operations too, so share one guarded connection
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SQLITE_SCHEMA_VERSION:
+            self._upgrade_schema()
+        self.conn.executescript(SQLITE_SCHEMA)
+
+    def _upgrade_schema(self):
+        """Re-key databases created before tasks had ids"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")]
+        if columns and "id" not in columns:
+            tasks = {name: TaskList() for (name,) in self.conn.execute("SELECT name FROM tabs ORDER BY position")}
+            for tab_name, text in self.conn.execute("SELECT tab, text FROM tasks ORDER BY tab, position"):
+                tasks[tab_name].add(text)
+            raw_states = {}
+            for tab_name, task, completed, date_completed in self.conn.execute(
+                    "SELECT tab, task, completed, date_completed FROM task_states"):
+                raw_states.setdefault(tab_name, {})[task] = _state_from_row(completed, date_completed)
+            task_states = upgrade_task_states(raw_states, tasks)
+            with self.conn:
+                self.conn.execute("DROP TABLE task_states")
+                self.conn.execute("DROP TABLE tasks")
+                self.conn.execute("DROP TABLE tabs")
+            self.conn.executescript(SQLITE_SCHEMA)
+            self.save_all(tasks, task_states)
+        self.conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+
+    def is_empty(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tabs").fetchone()[0] == 0
+
+    def load(self, default_tasks, default_settings):
+        with self._lock:
+            tasks = {name: TaskList() for (name,) in self.conn.execute("SELECT name FROM tabs ORDER BY position")}
+            for tab_name, task_id, text in self.conn.execute("SELECT tab, id, text FROM tasks ORDER BY tab, position"):
+                tasks[tab_name].add(text, task_id)
+            task_states = {}
+            for tab_name, task_id, completed, date_completed in self.conn.execute(
+                    "SELECT tab, task_id, completed, date_completed FROM task_states"):
+                task_states.setdefault(tab_name, {})[task_id] = _state_from_row(completed, date_completed)
+            settings = {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM settings")}
+        if not tasks:
+            tasks = tasks_from_json(default_tasks)
+        if not settings:
+            settings = default_settings
+        return tasks, task_states, settings
+
+    def _add_tab(self, tab_name):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO tabs SELECT ?, COALESCE(MAX(position), -1) + 1 FROM tabs", (tab_name,))
+
+    def _set_state(self, tab_name, task_id, state):
+        if state is None:
+            self.conn.execute("DELETE FROM task_states WHERE tab = ? AND task_id = ?", (tab_name, task_id))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO task_states SELECT ?, ?, ?, ? "
+                "WHERE EXISTS (SELECT 1 FROM tasks WHERE tab = ? AND id = ?)",
+                (tab_name, task_id, int(state["completed"]), state.get("date_completed"), tab_name, task_id))
+
+    def _set_tasks(self, tab_name, items):
+        """Make the tab hold exactly items ({"id", "text"} dicts) in that order"""
+        self._add_tab(tab_name)
+        self.conn.execute(
+            "DELETE FROM tasks WHERE tab = ? AND id NOT IN (SELECT value FROM json_each(?))",
+            (tab_name, json.dumps([item["id"] for item in items])))
+        self.conn.executemany(
+            "INSERT INTO tasks VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (tab, id) DO UPDATE SET position = excluded.position, text = excluded.text",
+            [(tab_name, item["id"], position, item["text"]) for position, item in enumerate(items)])
+
+    def record(self, op):
+        """Persist an operation that apply_op has already applied (so its task ids are resolved)"""
+        self.record_many([op])
+
+    def record_many(self, ops):
+        """Persist a batch of operations in one transaction"""
+        with self._lock, self.conn:
+            for op in ops:
+                self._record(op)
+
+    def _record(self, op):
+        kind = op["op"]
+        tab_name = op.get("tab")
+        if kind == "add_tab":
+            self._add_tab(tab_name)
+        elif kind == "delete_tab":
+            # Cascades to the tab's tasks and their states
+            self.conn.execute("DELETE FROM tabs WHERE name = ?", (tab_name,))
+        elif kind == "rename_tab":
+            # Cascades the new name to the tab's tasks and their states
+            self.conn.execute("UPDATE OR IGNORE tabs SET name = ? WHERE name = ?", (op["new_tab"], tab_name))
+        elif kind == "add_task":
+            self._add_tab(tab_name)
+            if op.get("index") is not None and not self.conn.execute(
+                    "SELECT 1 FROM tasks WHERE tab = ? AND (id = ? OR text = ?)",
+                    (tab_name, op["id"], op["task"])).fetchone():
+                # Positions have gaps after deletions: make room at the row now shown at index
+                row = self.conn.execute("SELECT position FROM tasks WHERE tab = ? ORDER BY position LIMIT 1 OFFSET ?",
+                                        (tab_name, op["index"])).fetchone()
+                if row is not None:
+                    self.conn.execute("UPDATE tasks SET position = position + 1 WHERE tab = ? AND position >= ?",
+                                      (tab_name, row[0]))
+                    self.conn.execute("INSERT INTO tasks VALUES (?, ?, ?, ?)",
+                                      (tab_name, op["id"], row[0], op["task"]))
+                    return
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tasks SELECT ?, ?, COALESCE(MAX(position), -1) + 1, ? FROM tasks WHERE tab = ?",
+                (tab_name, op["id"], op["task"], tab_name))
+        elif kind == "delete_task":
+            self.conn.execute("DELETE FROM tasks WHERE tab = ? AND id = ?", (tab_name, op["id"]))
+        elif kind == "rename_task":
+            self.conn.execute(
+                "UPDATE tasks SET text = ? WHERE tab = ? AND id = ? "
+                "AND NOT EXISTS (SELECT 1 FROM tasks WHERE tab = ? AND text = ?)",
+                (op["task"], tab_name, op["id"], tab_name, op["task"]))
+        elif kind == "set_tasks":
+            self._set_tasks(tab_name, op["tasks"])
+        elif kind == "set_state":
+            if op["id"] is not None:
+                self._set_state(tab_name, op["id"], op["state"])
+        elif kind == "clear_states":
+            if tab_name is None:
+                self.conn.execute("DELETE FROM task_states")
+            else:
+                self.conn.execute("DELETE FROM task_states WHERE tab = ?", (tab_name,))
+        else:
+            raise ValueError(f"Unknown store operation: {kind}")
+
+    def needs_compaction(self, tasks):
+        return False
+
+    def save_all(self, tasks, task_states):
+        """Replace the whole store, e.g. after importing a tasks file"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM tabs")
+            for tab_name, task_list in tasks.items():
+                self._set_tasks(tab_name, task_list.to_json())
+            for tab_name, tab_states in task_states.items():
+                for task_id, state in tab_states.items():
+                    self._set_state(tab_name, task_id, state)
+
+    def save_settings(self, settings):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM settings")
+            self.conn.executemany("INSERT INTO settings VALUES (?, ?)",
+                                  [(key, json.dumps(value)) for key, value in settings.items()])
+
+    def close(self, tasks, task_states):
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+def _state_from_row(completed, date_completed):
+    state = {"completed": bool(completed)}
+    if date_completed is not None:
+        state["date_completed"] = date_completed
+    return state
+
+def migrate_json_to_sqlite(json_storage, sqlite_storage, default_tasks, default_settings):
+    """One-shot import of the JSON files (and any pending journal) into SQLite"""
+    tasks, task_states, settings = json_storage.load(default_tasks, default_settings)
+    sqlite_storage.save_all(tasks, task_states)
+    sqlite_storage.save_settings(settings)
+    return tasks, task_states, settings
+
+def copy_store(tasks, task_states):
+    """Detached copy of the stores, safe to write out while the originals keep changing"""
+    return ({tab_name: TaskList(task_list.to_json()) for tab_name, task_list in tasks.items()},
+            {tab_name: {task_id: dict(state) for task_id, state in tab_states.items()}
+             for tab_name, tab_states in task_states.items()})
+
+class PersistenceWriter:
+    """Background writer that batches store operations and settings saves.
+
+    Callers only queue operations and mark settings dirty; a worker thread
+    waits `delay` seconds so bursts coalesce, then persists everything
+    pending in one batch (one journal fsync or one SQLite transaction).
+    Settings are skipped when their serialized form hasn't changed. flush()
+    writes synchronously, e.g. on exit.
+
+    A failed write (e.g. a full disk) loses nothing: the batch goes back to
+    the front of the queue for the next attempt. The worker reports the
+    error and keeps going; flush() and close() raise it.
+    """
+
+    def __init__(self, storage, lock, get_store, delay=0.5):
+        self.storage = storage
+        self.lock = lock              # the lock guarding the in-memory stores
+        self.get_store = get_store    # () -> (tasks, task_states, settings)
+        self.delay = delay
+        self._ops = []
+        self._in_flight = []  # taken from _ops and being written right now
+        self._settings_dirty = False
+        self._last_settings = None
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._stopped = False
+        self.error = None  # the last failed write, until a write succeeds again
+
+    def add_op(self, op):
+        """Queue an applied operation; call with the store lock held so ops stay in order"""
+        self._ops.append(op)
+        self._wake.set()
+
+    def pending(self):
+        """Number of operations waiting to be written"""
+        return len(self._ops)
+
+    def unwritten(self):
+        """Queued or in-flight operations the storage hasn't stored yet; call with the store lock held"""
+        return [op for op in self._in_flight + self._ops if "seq" not in op]
+
+    def mark_settings_dirty(self):
+        self._settings_dirty = True
+        self._wake.set()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def flush(self):
+        """Write everything pending now, on the calling thread"""
+        with self._write_lock:
+            # Take the pending work and, if needed, a snapshot in one step under
+            # the store lock so no operation lands in between
+            with self.lock:
+                tasks, task_states, settings = self.get_store()
+                ops, self._ops = self._ops, []
+                snapshot = None
+                if ops and self.storage.needs_compaction(tasks):
+                    snapshot = copy_store(tasks, task_states)
+                settings_text = None
+                if self._settings_dirty:
+                    self._settings_dirty = False
+                    settings_text = json.dumps(settings, sort_keys=True)
+
+            self._in_flight = ops
+            try:
+                if snapshot is not None:
+                    # The snapshot already contains every queued operation
+                    self.storage.save_all(*snapshot)
+                elif ops:
+                    self.storage.record_many(ops)
+            except Exception:
+                with self.lock:
+                    for op in ops:
+                        # Not written after all, so the next attempt numbers it again
+                        op.pop("seq", None)
+                    self._ops[:0] = ops
+                    self._settings_dirty = self._settings_dirty or settings_text is not None
+                raise
+            finally:
+                self._in_flight = []
+            if settings_text is not None and settings_text != self._last_settings:
+                try:
+                    self.storage.save_settings(json.loads(settings_text))
+                except Exception:
+                    self._settings_dirty = True
+                    raise
+                self._last_settings = settings_text
+            self.error = None
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            if self._stopped:
+                break
+            # Let the rest of the burst arrive before writing
+            time.sleep(self.delay)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Try again with the next change, or on close
+                if self.error is None:
+                    print(f"kaizen: could not save changes: {type(e).__name__}: {e}", file=sys.stderr)
+                self.error = e
+
+if __name__ == "__main__":
+    # python kaizen_storage.py [data_dir] migrates that directory's JSON files into kaizen.db
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    source = JsonStorage(os.path.join(data_dir, "tasks.json"), os.path.join(data_dir, "task_states.json"),
+                         os.path.join(data_dir, "settings.json"), os.path.join(data_dir, "tasks.journal"))
+    target = SqliteStorage(os.path.join(data_dir, "kaizen.db"))
+    tasks, task_states, settings = migrate_json_to_sqlite(source, target, {}, {})
+    target.close(tasks, task_states)
+    print(f"Migrated {len(tasks)} tabs, {sum(len(t) for t in tasks.values())} tasks "
+          f"and {sum(len(s) for s in task_states.values())} task states into kaizen.db")
@@ -0,0 +1,288 @@
+import json
+import os
+import sys
+import threading
+from kaizen_binary import BinaryCachedStorage
+from kaizen_storage import JsonStorage, apply_op
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Several processes (two windows, the CLI, the server) can share one data
+# folder. Every journal write happens under an advisory lock on tasks.lock
+# and carries a sequence number; the journal starts with a {"base": seq}
+# line naming the last sequence number already folded into tasks.json.
+# Before appending, a process first reads what others appended since its
+# last look and merges it into memory, so nobody overwrites anyone else.
+
+# Seconds between checks for changes made by other processes
+POLL_INTERVAL = 1.0
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared between processes.
+
+    Re-entrant within a process: nested and concurrent users on other
+    threads queue on a thread lock, since the OS lock is per process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            # Blocks for about 10 seconds, then raises
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            pass
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+def file_id(path):
+    """What changes whenever another process writes or replaces the file"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+class SharedStoreMixin:
+    """Journal-backed storage that other processes may write at the same time.
+
+    on_remote(ops, snapshot) is called with the store's changes made
+    elsewhere: operations to apply in order, after replacing the stores
+    with snapshot (tasks, task_states) when that is not None. It runs with
+    the file lock held, before any of this process's operations are
+    appended, so the journal order and the in-memory order always agree.
+    Call sync() to pick up changes without writing anything.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_lock = FileLock(os.path.join(os.path.dirname(self.tasks_file) or ".", "tasks.lock"))
+        self.on_remote = None
+        self.base = 0        # sequence number folded into tasks.json
+        self.version = 0     # last sequence number reflected in memory
+        self._offset = 0     # journal bytes read or written so far
+        self._seen = None    # file_id of the journal after our last read or write
+        self._task_count = 0
+
+    def load(self, default_tasks, default_settings):
+        with self.file_lock:
+            self.base, self.version, self._offset = self._scan_journal()
+            tasks, task_states, settings = super().load(default_tasks, default_settings)
+            self._task_count = sum(len(task_list) for task_list in tasks.values())
+            self._seen = file_id(self.journal.path)
+        return tasks, task_states, settings
+
+    def _read_journal(self, offset):
+        """(base or None, [(seq, op)], end offset) for the complete lines from offset on"""
+        try:
+            with open(self.journal.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None, [], 0
+        end = data.rfind(b"\n") + 1
+        base, entries = None, []
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # A torn line from a crash mid-append
+                continue
+            if "base" in entry and "op" not in entry:
+                base = entry["base"]
+            elif "op" in entry:
+                # Journals written before sequence numbers count up from the base
+                seq = entry.pop("seq", None)
+                previous = entries[-1][0] if entries else (base or 0)
+                entries.append((previous + 1 if seq is None else seq, entry))
+        return base, entries, offset + end
+
+    def _scan_journal(self):
+        base, entries, end = self._read_journal(0)
+        base = base or 0
+        return base, entries[-1][0] if entries else base, end
+
+    def _journal_base(self):
+        try:
+            with open(self.journal.path, "rb") as f:
+                first = f.readline()
+            entry = json.loads(first)
+            return entry["base"] if "base" in entry and "op" not in entry else 0
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError, TypeError):
+            return 0
+
+    def has_changed(self):
+        """Cheap check, without the lock, for writes by another process"""
+        return file_id(self.journal.path) != self._seen
+
+    def sync(self):
+        with self.file_lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        seen = file_id(self.journal.path)
+        if seen == self._seen:
+            return
+        base = self._journal_base()
+        if base != self.base or seen is None or seen[1] < self._offset:
+            # Someone compacted the journal into tasks.json
+            if base > self.version:
+                # ... including operations we never saw: reload the snapshot
+                tasks, task_states = self.load_stores({})
+                _, entries, self._offset = self._read_journal(0)
+                ops = [op for seq, op in entries if seq > base]
+                self.base = self.version = base
+                self._notify(ops, (tasks, task_states), entries)
+                self._seen = file_id(self.journal.path)
+                return
+            self._offset = 0
+            self.base = base
+        _, entries, self._offset = self._read_journal(self._offset)
+        self._notify([op for seq, op in entries if seq > self.version], None, entries)
+        self._seen = file_id(self.journal.path)
+
+    def _notify(self, ops, snapshot, entries):
+        if entries:
+            self.version = max(self.version, entries[-1][0])
+        if (ops or snapshot is not None) and self.on_remote is not None:
+            self.on_remote(ops, snapshot)
+
+    def record_many(self, ops):
+        with self.file_lock:
+            self._sync_locked()
+            lines = []
+            for op in ops:
+                self.version += 1
+                # Marks the op as written for anyone rebasing unwritten ops
+                op["seq"] = self.version
+                lines.append(op)
+            self.journal.append_many(lines)
+            self._offset = os.path.getsize(self.journal.path)
+            self._seen = file_id(self.journal.path)
+            if self.version - self.base >= max(self.COMPACT_MIN, self._task_count):
+                self._compact_locked()
+
+    def needs_compaction(self, tasks):
+        # Memory may hold operations not yet journaled, so compaction
+        # happens in record_many from what is on disk
+        return False
+
+    def _compact_locked(self):
+        """Fold the journal into the JSON files, rebuilt from disk rather than memory"""
+        tasks, task_states = self.load_stores({})
+        _, entries, _ = self._read_journal(0)
+        for seq, op in entries:
+            apply_op(tasks, task_states, op)
+        self._task_count = sum(len(task_list) for task_list in tasks.values())
+        self.save_all(tasks, task_states)
+
+    def save_all(self, tasks, task_states):
+        with self.file_lock:
+            super().save_all(tasks, task_states)
+            self.base = self.version
+            self.journal.append_many([{"base": self.base}])
+            self.journal.count = 0
+            self._offset = os.path.getsize(self.journal.path)
+            self._seen = file_id(self.journal.path)
+
+    def close(self, tasks, task_states):
+        # Memory may lack the latest writes of other processes, so it is only
+        # saved wholesale (after catching up) when a JSON file is missing, e.g.
+        # set aside as damaged; otherwise whatever is journaled is already safe
+        with self.file_lock:
+            self._sync_locked()
+            if not (os.path.exists(self.tasks_file) and os.path.exists(self.states_file)):
+                self.save_all(tasks, task_states)
+            elif self.version > self.base:
+                self._compact_locked()
+        self.journal.close()
+
+class SharedJsonStorage(SharedStoreMixin, JsonStorage):
+    pass
+
+class SharedBinaryStorage(SharedStoreMixin, BinaryCachedStorage):
+    pass
+
+class ChangeWatcher:
+    """Polls a shared storage and folds in changes made by other processes"""
+
+    def __init__(self, storage, interval=POLL_INTERVAL):
+        self.storage = storage
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        last_error = None
+        while not self._stopped.wait(self.interval):
+            if self.storage.has_changed():
+                try:
+                    self.storage.sync()
+                    last_error = None
+                except (OSError, ValueError):
+                    # A half-written file from a crashed writer; the next poll tries again
+                    pass
+                except Exception as e:
+                    # e.g. a malformed journal entry: say so once, and keep watching
+                    error = f"{type(e).__name__}: {e}"
+                    if error != last_error:
+                        print(f"kaizen: could not pick up outside changes: {error}", file=sys.stderr)
+                        last_error = error
+
+def replace_changed_tabs(tasks, task_states, new_tasks, new_task_states):
+    """Make the stores match a reloaded snapshot, touching only tabs that differ; returns them"""
+    changed = set()
+    for tab_name in list(tasks):
+        if tab_name not in new_tasks:
+            del tasks[tab_name]
+            task_states.pop(tab_name, None)
+            changed.add(tab_name)
+    for tab_name, task_list in new_tasks.items():
+        new_states = new_task_states.get(tab_name, {})
+        if (tab_name not in tasks or tasks[tab_name].to_json() != task_list.to_json()
+                or task_states.get(tab_name, {}) != new_states):
+            tasks[tab_name] = task_list
+            task_states[tab_name] = new_states
+            changed.add(tab_name)
+    return changed
@@ -0,0 +1,215 @@
+from bisect import bisect_left, insort
+from collections import deque
+from kaizen_storage import new_task_id, resolve_task_id
+
+# Undo keeps no snapshots: every store operation is recorded together with
+# the operations that reverse it, computed from the store just before it
+# runs, so an entry costs about as much as the change it undoes.
+
+# At most this many operations (forward and inverse) are kept across all
+# entries; the oldest entries go first
+UNDO_MAX_OPS = 500000
+
+# Undoing more than this many deletions in one tab rebuilds the tab with one
+# set_tasks instead of inserting each task back at its place
+RESTORE_AS_SET_TASKS = 16
+
+class TabPositions:
+    """Display positions of tasks while one batch deletes many of them.
+
+    Each tab's positions are read once; a later deletion's position is its
+    original one less the deletions before it, so a batch never rescans the tab.
+    """
+
+    def __init__(self):
+        self._tabs = {}  # tab -> ({task_id: original position}, sorted original positions deleted)
+
+    def index_of(self, tab_name, task_list, task_id):
+        if tab_name not in self._tabs:
+            self._tabs[tab_name] = (dict(zip(task_list.ids(), range(len(task_list)))), [])
+        original, deleted = self._tabs[tab_name]
+        idx = original.get(task_id)
+        if idx is None:
+            # Added during this batch
+            return task_list.index_of(task_id)
+        return idx - bisect_left(deleted, idx)
+
+    def deleted(self, tab_name, task_id):
+        if tab_name in self._tabs and task_id in self._tabs[tab_name][0]:
+            insort(self._tabs[tab_name][1], self._tabs[tab_name][0][task_id])
+
+    def forget(self, tab_name):
+        self._tabs.pop(tab_name, None)
+
+def inverse_ops(tasks, task_states, op, positions=None):
+    """Operations that undo op, computed before op is applied.
+
+    An add_task without an id is given one here, so its inverse can name it.
+    positions (a TabPositions) speeds up batches of deletions.
+    """
+    kind = op["op"]
+    tab_name = op.get("tab")
+    task_list = tasks.get(tab_name)
+    tab_states = task_states.get(tab_name, {})
+    if positions is not None and kind not in ("delete_task", "set_state", "clear_states"):
+        if kind != "add_task" or op.get("index") is not None:
+            # Anything but an append moves tasks around
+            positions.forget(tab_name)
+            positions.forget(op.get("new_tab"))
+
+    if kind == "add_tab":
+        return [] if task_list is not None else [{"op": "delete_tab", "tab": tab_name}]
+    if kind == "delete_tab":
+        if task_list is None:
+            return []
+        return ([{"op": "add_tab", "tab": tab_name}, {"op": "set_tasks", "tab": tab_name, "tasks": task_list.to_json()}]
+                + [{"op": "set_state", "tab": tab_name, "id": task_id, "state": dict(state)}
+                   for task_id, state in tab_states.items()])
+    if kind == "rename_tab":
+        if task_list is None or op["new_tab"] in tasks:
+            return []
+        return [{"op": "rename_tab", "tab": op["new_tab"], "new_tab": tab_name}]
+    if kind == "add_task":
+        if task_list is None:
+            if op.get("id") is None:
+                op["id"] = new_task_id()
+            return [{"op": "delete_tab", "tab": tab_name}]
+        if op["task"] in task_list:
+            return []
+        if op.get("id") is None or task_list.has_id(op["id"]):
+            op["id"] = new_task_id()
+        return [{"op": "delete_task", "tab": tab_name, "id": op["id"]}]
+    if kind == "delete_task":
+        task_id = resolve_task_id(task_list, op)
+        if task_list is None or not task_list.has_id(task_id):
+            return []
+        if positions is not None:
+            index = positions.index_of(tab_name, task_list, task_id)
+            positions.deleted(tab_name, task_id)
+        else:
+            index = task_list.index_of(task_id)
+        inverse = [{"op": "add_task", "tab": tab_name, "task": task_list.text_of(task_id), "id": task_id,
+                    "index": index}]
+        if task_id in tab_states:
+            inverse.append({"op": "set_state", "tab": tab_name, "id": task_id, "state": dict(tab_states[task_id])})
+        return inverse
+    if kind == "rename_task":
+        if task_list is None or not task_list.has_id(op["id"]) or op["task"] in task_list:
+            return []
+        return [{"op": "rename_task", "tab": tab_name, "id": op["id"], "task": task_list.text_of(op["id"])}]
+    if kind == "set_tasks":
+        if task_list is None:
+            return [{"op": "delete_tab", "tab": tab_name}]
+        # States of tasks the new list drops are lost with them, so they come back too
+        return ([{"op": "set_tasks", "tab": tab_name, "tasks": task_list.to_json()}]
+                + [{"op": "set_state", "tab": tab_name, "id": task_id, "state": dict(state)}
+                   for task_id, state in tab_states.items()])
+    if kind == "set_state":
+        task_id = resolve_task_id(task_list, op)
+        if task_id is None:
+            return []
+        state = tab_states.get(task_id)
+        return [{"op": "set_state", "tab": tab_name, "id": task_id, "state": dict(state) if state else None}]
+    if kind == "clear_states":
+        tab_names = list(task_states) if tab_name is None else [tab_name]
+        return [{"op": "set_state", "tab": name, "id": task_id, "state": dict(state)}
+                for name in tab_names for task_id, state in task_states.get(name, {}).items()]
+    raise ValueError(f"Unknown store operation: {kind}")
+
+def compact_restores(ops, tasks):
+    """Replace long runs of tasks put back in place (add_task with an index) by one set_tasks per tab.
+
+    Each insert at a position rebuilds the tab, so undoing a large deletion
+    rebuilds it once instead. set_state ops inside a run follow its set_tasks.
+    """
+    result = []
+    start = 0
+    while start < len(ops):
+        op = ops[start]
+        if not (op["op"] == "add_task" and op.get("index") is not None):
+            result.append(op)
+            start += 1
+            continue
+        tab_name = op["tab"]
+        end = start
+        while end < len(ops) and ops[end].get("tab") == tab_name and (
+                ops[end]["op"] == "set_state" or (ops[end]["op"] == "add_task" and ops[end].get("index") is not None)):
+            end += 1
+        run = ops[start:end]
+        restores = [op for op in run if op["op"] == "add_task"]
+        if len(restores) <= RESTORE_AS_SET_TASKS or tab_name not in tasks:
+            result += run
+        else:
+            items = tasks[tab_name].to_json()
+            texts = {item["text"] for item in items}
+            ids = {item["id"] for item in items}
+            for op in restores:
+                if op["task"] not in texts and op["id"] not in ids:
+                    items.insert(op["index"], {"id": op["id"], "text": op["task"]})
+                    texts.add(op["task"])
+                    ids.add(op["id"])
+            result.append({"op": "set_tasks", "tab": tab_name, "tasks": items})
+            result += [op for op in run if op["op"] == "set_state"]
+        start = end
+    return result
+
+class UndoEntry:
+    """One user-level change, kept as the operations that undo it, one list per commit"""
+
+    def __init__(self, label, group=None):
+        self.label = label
+        self.group = group
+        self.inverse_parts = []
+        self.settings = {}  # key -> (value before, value after)
+
+    def add(self, inverse):
+        if inverse:
+            self.inverse_parts.append(inverse)
+
+    def size(self):
+        return sum(len(part) for part in self.inverse_parts)
+
+    def inverse(self):
+        """The undoing operations in the order to apply them"""
+        return [op for part in reversed(self.inverse_parts) for op in part]
+
+class UndoHistory:
+    """Undo and redo stacks of UndoEntry, bounded by depth entries and max_ops operations"""
+
+    def __init__(self, depth, max_ops=UNDO_MAX_OPS):
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.depth = depth
+        self.max_ops = max_ops
+        self._size = 0
+
+    def push(self, entry, clear_redo=True):
+        """Record a change that can be undone; a new change (not a redo) forgets what could be redone"""
+        if clear_redo:
+            self.redo_stack.clear()
+        top = self.undo_stack[-1] if self.undo_stack else None
+        if entry.group is not None and top is not None and top.group == entry.group:
+            # e.g. the batches of one import undo together
+            top.inverse_parts += entry.inverse_parts
+            for key, (before, after) in entry.settings.items():
+                top.settings[key] = (top.settings[key][0] if key in top.settings else before, after)
+        else:
+            self.undo_stack.append(entry)
+        self._size += entry.size()
+        while self.undo_stack and (len(self.undo_stack) > self.depth or self._size > self.max_ops):
+            self._size -= self.undo_stack.popleft().size()
+
+    def push_redo(self, entry):
+        self.redo_stack.append(entry)
+        if len(self.redo_stack) > self.depth:
+            del self.redo_stack[0]
+
+    def pop_undo(self):
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self._size -= entry.size()
+        return entry
+
+    def pop_redo(self):
+        return self.redo_stack.pop() if self.redo_stack else None
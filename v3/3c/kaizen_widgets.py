@@ -0,0 +1,183 @@
+import tkinter as tk
+from tkinter import font
+
+DONE_COLOR = "gray"
+
+class ListboxView:
+    """Keeps a tk.Listbox in step with a tab's rows by applying only the differences.
+
+    Rows are (task_id, text, completed) tuples. sync() trims the common head
+    and tail of the old and new rows, replaces the block in between with one
+    delete and one insert call, then recolours rows whose completion flipped,
+    so adding one task to a 20k-row tab is a single Tcl call.
+    """
+
+    def __init__(self, listbox):
+        self.listbox = listbox
+        self.rows = []
+
+    def sync(self, rows):
+        old = self.rows
+        start = 0
+        limit = min(len(old), len(rows))
+        while start < limit and old[start][0] == rows[start][0] and old[start][1] == rows[start][1]:
+            start += 1
+        old_end, new_end = len(old), len(rows)
+        while (old_end > start and new_end > start
+               and old[old_end - 1][0] == rows[new_end - 1][0] and old[old_end - 1][1] == rows[new_end - 1][1]):
+            old_end -= 1
+            new_end -= 1
+
+        if old_end > start:
+            self.listbox.delete(start, old_end - 1)
+        if new_end > start:
+            self.listbox.insert(start, *[text for _, text, _ in rows[start:new_end]])
+            for idx in range(start, new_end):
+                if rows[idx][2]:
+                    self.listbox.itemconfig(idx, fg=DONE_COLOR)
+
+        # Rows kept in place only need recolouring when their completion changed
+        for idx in range(start):
+            if old[idx][2] != rows[idx][2]:
+                self._recolour(idx, rows[idx][2])
+        shift = new_end - old_end
+        for old_idx in range(old_end, len(old)):
+            new_idx = old_idx + shift
+            if old[old_idx][2] != rows[new_idx][2]:
+                self._recolour(new_idx, rows[new_idx][2])
+        self.rows = rows
+
+    def _recolour(self, idx, completed):
+        # An empty colour falls back to the listbox's own foreground
+        self.listbox.itemconfig(idx, fg=DONE_COLOR if completed else "")
+
+class VirtualTaskList:
+    """A task list that only materializes the rows currently on screen.
+
+    The wrapped tk.Listbox holds just one window of rows; scrolling moves
+    the window over `source`, which reads rows straight from the store
+    (len(source) and source.rows(first, last) -> [(task_id, text,
+    completed)]). Selection is tracked by task id so it survives scrolling.
+    curselection() returns indices into the whole tab, so code written
+    against a plain Listbox keeps working.
+    """
+
+    WHEEL_ROWS = 3
+
+    def __init__(self, listbox, scrollbar, source):
+        self.listbox = listbox
+        self.scrollbar = scrollbar
+        self.source = source
+        self.view = ListboxView(listbox)
+        self.first = 0
+        self.visible = max(1, int(listbox.cget("height")))
+        self.selected = set()
+
+        scrollbar.config(command=self.yview)
+        listbox.config(yscrollcommand="")
+        listbox.bind("<Configure>", self._on_configure)
+        listbox.bind("<<ListboxSelect>>", self._on_select)
+        listbox.bind("<MouseWheel>", self._on_wheel)
+        listbox.bind("<Button-4>", lambda event: self._scroll_by(-self.WHEEL_ROWS))
+        listbox.bind("<Button-5>", lambda event: self._scroll_by(self.WHEEL_ROWS))
+        listbox.bind("<Up>", lambda event: self._move_selection(-1))
+        listbox.bind("<Down>", lambda event: self._move_selection(1))
+
+    def refresh(self):
+        """Redraw the visible window from the source"""
+        total = len(self.source)
+        self.first = max(0, min(self.first, total - self.visible))
+        rows = self.source.rows(self.first, min(total, self.first + self.visible))
+        self.view.sync(rows)
+
+        self.listbox.selection_clear(0, tk.END)
+        for idx, row in enumerate(rows):
+            if row[0] in self.selected:
+                self.listbox.selection_set(idx)
+
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def curselection(self):
+        """Selected row indices within the whole tab, in display order"""
+        indices = []
+        remaining = set(self.selected)
+        for idx, row in enumerate(self.view.rows):
+            if row[0] in remaining:
+                indices.append(self.first + idx)
+                remaining.discard(row[0])
+        # Rows scrolled out of view (only possible with multi-select) are looked up in the source
+        for task_id in remaining:
+            idx = self.source.index_of(task_id)
+            if idx is not None:
+                indices.append(idx)
+        return tuple(sorted(indices))
+
+    def selected_ids(self):
+        """Ids of every selected task, including ones scrolled out of view"""
+        return list(self.selected)
+
+    def selection_clear(self):
+        self.selected.clear()
+        self.listbox.selection_clear(0, tk.END)
+
+    def see(self, index):
+        """Scroll so the row at index is visible"""
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible:
+            self.first = index - self.visible + 1
+        self.refresh()
+
+    def yview(self, *args):
+        total = len(self.source)
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.first += int(args[1]) * step
+        self.refresh()
+
+    def _scroll_by(self, rows):
+        self.first += rows
+        self.refresh()
+        return "break"
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_by(-notches * self.WHEEL_ROWS)
+
+    def _on_configure(self, event):
+        line_height = self._line_height()
+        border = int(self.listbox.cget("borderwidth")) + int(self.listbox.cget("highlightthickness"))
+        visible = max(1, (event.height - 2 * border) // line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def _line_height(self):
+        list_font = font.Font(root=self.listbox, font=self.listbox.cget("font"))
+        return list_font.metrics("linespace") + 1 + 2 * int(self.listbox.cget("selectborderwidth"))
+
+    def _on_select(self, event):
+        window_ids = {self.view.rows[idx][0] for idx in self.listbox.curselection()}
+        if self.listbox.cget("selectmode") in ("extended", "multiple"):
+            on_screen = {row[0] for row in self.view.rows}
+            self.selected = {task_id for task_id in self.selected if task_id not in on_screen} | window_ids
+        else:
+            self.selected = window_ids
+
+    def _move_selection(self, delta):
+        total = len(self.source)
+        if not total:
+            return "break"
+        current = self.curselection()
+        index = current[0] + delta if current else self.first
+        index = max(0, min(total - 1, index))
+        self.selected = {self.source.rows(index, index + 1)[0][0]}
+        self.see(index)
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
@@ -1,40 +1,28 @@
+import time
+STARTED = time.perf_counter()  # --startup-report measures from here
+
 import tkinter as tk
-from tkinter import messagebox, ttk, colorchooser, filedialog
+from tkinter import ttk
 import json
-import time
-from datetime import datetime, timedelta
-import threading
-import os
-
-TASKS_FILE = "tasks.json"
-SETTINGS_FILE = "settings.json"
-
-default_settings = {
-    "theme": "light",
-    "custom_color": "#ffffff",
-    "reset_hour": 0,  # Default reset at midnight (0:00)
-    "reset_minute": 0,
-    "window_width": 600,
-    "window_height": 400,
-    "tab_order": ["Dailies"]
-}
-
-# Default daily tasks
-daily_tasks = ["Physical Win", "Mental Win", "Spiritual Win"]
-
-def load_json(file, default):
-    try:
-        with open(file, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return default
+import queue
+import sys
+from kaizen_core import PROTECTED_TABS, KaizenStore
+from kaizen_widgets import VirtualTaskList
+
+# Dialogs, stats and the importer are imported where they are first used,
+# so the window comes up without loading them
+
+# With --startup-report the app prints how long each startup phase took and
+# exits, failing if the tasks took longer than the budget to show
+STARTUP_BUDGET_MS = 500
+startup_marks = []  # [(phase, ms since STARTED)]
 
-def save_json(file, data):
-    with open(file, "w") as f:
-        json.dump(data, f, indent=4)
+def mark_startup(phase):
+    startup_marks.append((phase, (time.perf_counter() - STARTED) * 1000))
 
 def import_json(file_type):
     """Import JSON file for tasks or settings"""
+    from tkinter import filedialog, messagebox
     file_path = filedialog.askopenfilename(
         title=f"Import {file_type.capitalize()}",
         filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
@@ -49,174 +37,424 @@ def import_json(file_type):
         messagebox.showerror("Error", f"Failed to import file: {e}")
         return None
 
-# Load tasks and settings
-tasks = load_json(TASKS_FILE, {"Dailies": daily_tasks})
-task_states = load_json("task_states.json", {})
-settings = load_json(SETTINGS_FILE, default_settings)
+mark_startup("imports")
 
-# Ensure tab_order exists in settings
-if "tab_order" not in settings:
-    settings["tab_order"] = list(tasks.keys())
-
-def save_tasks():
-    save_json(TASKS_FILE, tasks)
-
-def save_settings():
-    save_json(SETTINGS_FILE, settings)
-
-def save_task_states():
-    save_json("task_states.json", task_states)
-
-def add_task(tab_name, entry_widget, listbox):
-    task = entry_widget.get().strip()
-    if task and task not in tasks[tab_name]:
-        tasks[tab_name].append(task)
-        save_tasks()
-        update_list(tab_name, listbox)
+# The bare window is up before the store loads, so a large workspace shows a
+# "Loading..." window at once instead of nothing
+root = tk.Tk()
+root.title("Kaizen Task Manager")
+root.geometry("600x400")
+loading_label = tk.Label(root, text="Loading...")
+loading_label.pack(expand=True)
+root.update()
+mark_startup("first paint")
+
+# Load tasks and settings; the store owns all task, tab, state and reset logic
+store = KaizenStore.open()
+mark_startup("store loaded")
+tasks, task_states, settings = store.tasks, store.task_states, store.settings
+store_lock = store.lock
+writer = store.writer
+save_settings = store.save_settings
+
+# Changes made off the Tk thread, as immutable (kind, value) tuples such as ("refresh_tab", tab_name).
+# Only the main loop touches widgets; it drains this queue in batches.
+ui_updates = queue.Queue()
+UI_DRAIN_INTERVAL = 200  # ms
+STATS_MAX_LINES = 40  # the stats dialog lists the top streaks only
+
+# Another window or the CLI changed the shared store: redraw, add or drop just those tabs
+store.on_change = lambda changed: [ui_updates.put(("sync_tab", tab_name)) for tab_name in changed]
+
+def add_task(tab_name, entry_widget, task_list):
+    if store.add_task(tab_name, entry_widget.get()):
+        update_list(tab_name, task_list)
     entry_widget.delete(0, tk.END)
 
-def delete_task(tab_name, listbox):
-    selected = listbox.curselection()
+# Each of these acts on every selected task as one store operation,
+# written out together and redrawn once
+
+def delete_task(tab_name, task_list):
+    selected = task_list.selected_ids()
     if selected:
-        task_text = listbox.get(selected[0])
-        tasks[tab_name].remove(task_text)
-        # Remove task state if exists
-        task_key = f"{tab_name}:{task_text}"
-        if task_key in task_states:
-            del task_states[task_key]
-            save_task_states()
-        save_tasks()
-        update_list(tab_name, listbox)
-
-def mark_done(tab_name, listbox):
-    selected = listbox.curselection()
+        # Removes the task states too, if they exist
+        store.delete_tasks(tab_name, selected)
+        task_list.selection_clear()
+        update_list(tab_name, task_list)
+
+def mark_done(tab_name, task_list):
+    selected = task_list.selected_ids()
     if selected:
-        idx = selected[0]
-        task_text = listbox.get(idx)
-        task_key = f"{tab_name}:{task_text}"
-        
         # Toggle completion state
-        if task_key in task_states and task_states[task_key]["completed"]:
-            task_states[task_key]["completed"] = False
-            listbox.itemconfig(idx, {'fg': 'black' if settings["theme"] == "light" else 'white'})
-        else:
-            task_states[task_key] = {"completed": True, "date_completed": datetime.now().strftime("%Y-%m-%d")}
-            listbox.itemconfig(idx, {'fg': 'gray'})
-        
-        save_task_states()
+        store.toggle_tasks(tab_name, selected)
+        update_list(tab_name, task_list)
 
-def update_list(tab_name, listbox):
-    listbox.delete(0, tk.END)
-    for task in tasks[tab_name]:
-        listbox.insert(tk.END, task)
-        
-        # Apply completed state if task is marked as done
-        task_key = f"{tab_name}:{task}"
-        if task_key in task_states and task_states[task_key]["completed"]:
-            idx = listbox.size() - 1
-            listbox.itemconfig(idx, {'fg': 'gray'})
+def set_done(tab_name, task_list, completed):
+    selected = task_list.selected_ids()
+    if selected:
+        store.set_completed(tab_name, selected, completed)
+        update_list(tab_name, task_list)
+
+def move_tasks(tab_name, task_list, to_tab):
+    selected = task_list.selected_ids()
+    if selected and store.move_tasks(tab_name, selected, to_tab):
+        task_list.selection_clear()
+        update_list(tab_name, task_list)
+        refresh_tab(to_tab)
+
+def show_move_menu(tab_name, task_list, button):
+    """Offer the other tabs as destinations for the selected tasks"""
+    menu = tk.Menu(button, tearoff=0)
+    for name in store.tab_names():
+        if name != tab_name:
+            menu.add_command(label=name, command=lambda name=name: move_tasks(tab_name, task_list, name))
+    menu.tk_popup(button.winfo_rootx(), button.winfo_rooty() + button.winfo_height())
+
+class TabRows:
+    """Row source for a tab's VirtualTaskList, read straight from the store.
+
+    With a search query set, only the matching tasks are listed; the
+    matches are looked up again whenever the search index has changed.
+    """
+
+    def __init__(self, tab_name):
+        self.tab_name = tab_name
+        self.query = ""
+        self._matches = None
+        self._matched = None  # (query, index generation) the matches are for
+
+    def matches(self):
+        """Ids of the tasks matching the query in display order, or None when not searching"""
+        if not self.query.strip():
+            return None
+        index = store.search_index()
+        if self._matched != (self.query, index.generation):
+            self._matches = [task_id for _, task_id in store.search(self.query, self.tab_name)]
+            self._matched = (self.query, index.generation)
+        return self._matches
+
+    def __len__(self):
+        matches = self.matches()
+        return len(tasks.get(self.tab_name, ())) if matches is None else len(matches)
+
+    def rows(self, first, last):
+        # Read under the lock so a background reset can't change the rows mid-iteration
+        matches = self.matches()
+        if matches is None:
+            return store.rows(self.tab_name, first, last)
+        return store.task_rows(self.tab_name, matches[first:last])
+
+    def index_of(self, task_id):
+        matches = self.matches()
+        if matches is not None:
+            return matches.index(task_id) if task_id in matches else None
+        with store_lock:
+            task_list = tasks.get(self.tab_name)
+            return task_list.index_of(task_id) if task_list is not None else None
+
+    def id_at(self, index):
+        matches = self.matches()
+        if matches is not None:
+            return matches[index]
+        with store_lock:
+            return tasks[self.tab_name].id_at(index)
+
+def current_tab():
+    selected = notebook.select()
+    return notebook.tab(selected, "text") if selected else None
+
+def apply_search(event=None):
+    """Filter the visible tab down to the tasks matching the search box"""
+    tab_name = current_tab()
+    widgets = tab_widgets.get(tab_name)
+    if widgets is None:
+        return
+    task_list = widgets["task_list"]
+    query = search_entry.get()
+    if task_list.source.query != query:
+        task_list.source.query = query
+        task_list.first = 0
+        task_list.selection_clear()
+    update_list(tab_name, task_list)
+    matches = task_list.source.matches()
+    search_label.config(text="" if matches is None else f"{len(matches)} found")
+
+def search_next_tab(event=None):
+    """Jump to the next tab, in tab order, with tasks matching the search box"""
+    query = search_entry.get()
+    if not query.strip():
+        return
+    tab_names = store.tab_names()
+    tab_name = current_tab()
+    start = tab_names.index(tab_name) + 1 if tab_name in tab_names else 0
+    for name in tab_names[start:] + tab_names[:start]:
+        found = store.search(query, name, limit=1)
+        if found:
+            if name != tab_name:
+                # Builds the tab if needed and applies the search to it
+                notebook.select(tab_frames[name])
+                on_tab_changed(None)
+            widgets = tab_widgets[name]
+            widgets["task_list"].selected = {found[0][1]}
+            widgets["task_list"].see(0)
+            return
+    search_label.config(text="No matches")
+
+def update_list(tab_name, task_list):
+    # Only the visible rows are redrawn, and only where they changed
+    task_list.refresh()
 
 def add_tab():
     new_tab_name = tab_entry.get().strip()
-    if new_tab_name and new_tab_name not in tasks:
-        tasks[new_tab_name] = []
-        # Add to tab order
-        settings["tab_order"].append(new_tab_name)
-        save_tasks()
-        save_settings()
+    if store.add_tab(new_tab_name):
         create_tab(new_tab_name)
     tab_entry.delete(0, tk.END)
 
 def delete_tab():
+    from tkinter import messagebox
     current_tab_idx = notebook.index(notebook.select())
     if current_tab_idx >= 0:
         tab_name = notebook.tab(current_tab_idx, "text")
         
         # Prevent deletion of "Dailies" tab
-        if tab_name == "Dailies":
+        if tab_name in PROTECTED_TABS:
             messagebox.showinfo("Cannot Delete", "The Dailies tab cannot be deleted.")
             return
         
         # Confirm deletion
         if messagebox.askyesno("Confirm Delete", f"Delete tab '{tab_name}' and all its tasks?"):
-            notebook.forget(current_tab_idx)
+            destroy_tab_frame(tab_name)
             
-            # Remove from tasks and task_states
-            if tab_name in tasks:
-                del tasks[tab_name]
-                # Remove all task states for this tab
-                for key in list(task_states.keys()):
-                    if key.startswith(f"{tab_name}:"):
-                        del task_states[key]
-                
-                # Remove from tab order
-                if tab_name in settings["tab_order"]:
-                    settings["tab_order"].remove(tab_name)
-                
-                save_tasks()
-                save_task_states()
-                save_settings()
+            # Removes its tasks, task states and place in the tab order
+            store.delete_tab(tab_name)
 
 def create_tab(tab_name):
+    """Add a placeholder tab; its widgets are built the first time it is shown"""
+    destroy_tab_frame(tab_name)
     frame = ttk.Frame(notebook)
     notebook.add(frame, text=tab_name)
+    tab_frames[tab_name] = frame
+    return frame
+
+def destroy_tab_frame(tab_name):
+    """Destroy a tab's frame and widgets and drop them from the registries"""
+    tab_widgets.pop(tab_name, None)
+    frame = tab_frames.pop(tab_name, None)
+    if frame is not None:
+        unregister_tree(frame)
+        frame.destroy()
+
+def build_tab(tab_name):
+    """Build and populate a placeholder tab's widgets, once"""
+    if tab_name in tab_widgets:
+        return tab_widgets[tab_name]
+    frame = tab_frames[tab_name]
     
-    listbox = tk.Listbox(frame, width=50, height=10, bg=settings["custom_color"],
-                        fg="black" if settings["theme"] == "light" else "white")
+    # Shift- and Ctrl-click select several tasks for the buttons below
+    listbox = register("listbox", tk.Listbox(frame, width=50, height=10, selectmode=tk.EXTENDED))
     listbox.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
-    update_list(tab_name, listbox)
     
-    scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL, command=listbox.yview)
+    scrollbar = register("scrollbar", tk.Scrollbar(frame, orient=tk.VERTICAL))
     scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-    listbox.config(yscrollcommand=scrollbar.set)
     
-    entry = tk.Entry(frame, width=50)
+    # Only the rows on screen are ever materialized in the listbox
+    task_list = VirtualTaskList(listbox, scrollbar, TabRows(tab_name))
+    update_list(tab_name, task_list)
+    
+    entry = register("entry", tk.Entry(frame, width=50))
     entry.pack(pady=5)
     
-    btn_frame = tk.Frame(frame, bg=settings["custom_color"])
+    btn_frame = register("frame", tk.Frame(frame))
     btn_frame.pack()
     
-    add_btn = tk.Button(btn_frame, text="Add Task", 
-                      command=lambda: add_task(tab_name, entry, listbox))
+    add_btn = register("button", tk.Button(btn_frame, text="Add Task", 
+                      command=lambda: add_task(tab_name, entry, task_list)))
     add_btn.pack(side=tk.LEFT, padx=5)
     
-    delete_btn = tk.Button(btn_frame, text="Delete Task", 
-                        command=lambda: delete_task(tab_name, listbox))
+    delete_btn = register("button", tk.Button(btn_frame, text="Delete Task", 
+                        command=lambda: delete_task(tab_name, task_list)))
     delete_btn.pack(side=tk.LEFT, padx=5)
     
-    mark_btn = tk.Button(btn_frame, text="Toggle Completion", 
-                      command=lambda: mark_done(tab_name, listbox))
+    mark_btn = register("button", tk.Button(btn_frame, text="Toggle Completion", 
+                      command=lambda: mark_done(tab_name, task_list)))
     mark_btn.pack(side=tk.LEFT, padx=5)
     
+    done_btn = register("button", tk.Button(btn_frame, text="Done",
+                      command=lambda: set_done(tab_name, task_list, True)))
+    done_btn.pack(side=tk.LEFT, padx=5)
+    
+    undone_btn = register("button", tk.Button(btn_frame, text="Not Done",
+                        command=lambda: set_done(tab_name, task_list, False)))
+    undone_btn.pack(side=tk.LEFT, padx=5)
+    
+    move_btn = register("button", tk.Button(btn_frame, text="Move To..."))
+    move_btn.config(command=lambda: show_move_menu(tab_name, task_list, move_btn))
+    move_btn.pack(side=tk.LEFT, padx=5)
+    
     # Return a dictionary of widgets for this tab for easier theme management
-    return {
+    widgets = {
         "frame": frame,
         "listbox": listbox,
+        "task_list": task_list,
         "entry": entry,
         "btn_frame": btn_frame,
-        "buttons": [add_btn, delete_btn, mark_btn]
+        "buttons": [add_btn, delete_btn, mark_btn, done_btn, undone_btn, move_btn]
     }
+    tab_widgets[tab_name] = widgets
+    
+    # Match the theme the rest of the window already has
+    style_widgets([("listbox", listbox), ("scrollbar", scrollbar), ("entry", entry), ("frame", btn_frame),
+                   ("button", add_btn), ("button", delete_btn), ("button", mark_btn),
+                   ("button", done_btn), ("button", undone_btn), ("button", move_btn)], theme_options())
+    return widgets
 
-# Dictionary to keep track of all tab widgets
+# Tab frames by tab name, including placeholders that haven't been built yet
+tab_frames = {}
+
+# Dictionary to keep track of all built tab widgets
 tab_widgets = {}
 
+# Delay between idle-time tab builds, so prefetching never holds up input
+PREFETCH_DELAY = 50  # ms
+
+def on_tab_changed(event):
+    """Build the selected tab's widgets the first time it is shown"""
+    selected = notebook.select()
+    if selected:
+        build_tab(notebook.tab(selected, "text"))
+        show_reset_rule()
+        apply_search()
+
+def prefetch_tabs():
+    """Build one unopened tab whenever the UI is idle, so switching to it later is instant"""
+    if not settings.get("prefetch_tabs", True):
+        return
+    for tab_name in settings["tab_order"]:
+        if tab_name in tab_frames and tab_name not in tab_widgets:
+            build_tab(tab_name)
+            root.after(PREFETCH_DELAY, lambda: root.after_idle(prefetch_tabs))
+            break
+
+def refresh_tab(tab_name):
+    """Redraw a tab's list from the store, if the tab is on screen"""
+    widgets = tab_widgets.get(tab_name)
+    if widgets and tab_name in tasks:
+        update_list(tab_name, widgets["task_list"])
+
+def sync_tab(tab_name):
+    """Add or drop a tab's frame to match the store; returns True if the tab only needs a redraw"""
+    if tab_name not in tasks:
+        destroy_tab_frame(tab_name)
+        return False
+    if tab_name not in tab_frames:
+        create_tab(tab_name)
+        return False
+    return True
+
+def order_tabs():
+    """Move the notebook's tabs into the stored tab order"""
+    position = 0
+    for tab_name in store.tab_names():
+        if tab_name in tab_frames:
+            notebook.insert(position, tab_frames[tab_name])
+            position += 1
+
+def undo(event=None):
+    replay(store.undo(), "Undid", "Nothing to undo")
+
+def redo(event=None):
+    replay(store.redo(), "Redid", "Nothing to redo")
+
+def replay(result, verb, nothing):
+    """Bring the window in line with an undo or redo"""
+    if result is None:
+        status_label.config(text=nothing)
+        return
+    label, changed = result
+    for tab_name in changed:
+        if sync_tab(tab_name):
+            refresh_tab(tab_name)
+    order_tabs()
+    show_reset_rule()
+    status_label.config(text=f"{verb}: {label}")
+
+def drain_ui_updates():
+    """Apply changes queued by background threads, redrawing each affected tab once"""
+    tabs_to_refresh = set()
+    while True:
+        try:
+            kind, value = ui_updates.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "refresh_tab":
+            tabs_to_refresh.add(value)
+        elif kind == "add_tab":
+            if value in tasks and value not in tab_frames:
+                if value not in settings["tab_order"]:
+                    settings["tab_order"].append(value)
+                    save_settings()
+                create_tab(value)
+        elif kind == "sync_tab":
+            if sync_tab(value):
+                tabs_to_refresh.add(value)
+            else:
+                tabs_to_refresh.discard(value)
+        elif kind == "status":
+            status_label.config(text=value)
+        elif kind == "import_done":
+            # Shown once this drain is over, so the dialog doesn't hold up the redraws
+            root.after_idle(finish_import, value)
+    for tab_name in tabs_to_refresh:
+        refresh_tab(tab_name)
+    root.after(UI_DRAIN_INTERVAL, drain_ui_updates)
+
 def toggle_theme():
     settings["theme"] = "dark" if settings["theme"] == "light" else "light"
     save_settings()
     apply_theme()
 
-def get_all_widgets(parent):
-    """Recursively get all widgets inside a parent widget"""
-    all_widgets = [parent]
-    if hasattr(parent, 'winfo_children'):
-        children = parent.winfo_children()
-        for child in children:
-            all_widgets.extend(get_all_widgets(child))
-    return all_widgets
+# Widgets by theming role ("frame", "button", "entry", "label", "listbox", "scrollbar"),
+# keyed by widget path. Everything is registered where it is created, so
+# theming touches exactly these widgets instead of walking the widget tree.
+widget_registry = {role: {} for role in ("frame", "button", "entry", "label", "listbox", "scrollbar")}
+
+def register(role, widget):
+    """Record a widget under its theming role and return it"""
+    widget_registry[role][str(widget)] = widget
+    return widget
+
+def unregister_tree(parent):
+    """Forget every registered widget inside parent (e.g. a tab being destroyed)"""
+    prefix = str(parent) + "."
+    for widgets in widget_registry.values():
+        for path in [path for path in widgets if path.startswith(prefix)]:
+            del widgets[path]
+
+def theme_colors():
+    """Background and foreground colours for the current theme"""
+    if settings["theme"] == "dark":
+        return "#333", "#fff"
+    return "#fff", "#000"
+
+def theme_options():
+    """Options each role gets from the current theme; listbox backgrounds use the custom color"""
+    bg_color, fg_color = theme_colors()
+    return {
+        "frame": {"bg": bg_color},
+        "button": {"bg": bg_color, "fg": fg_color},
+        "entry": {"bg": bg_color, "fg": fg_color},
+        "label": {"bg": bg_color, "fg": fg_color},
+        "listbox": {"fg": fg_color, "bg": settings["custom_color"]},
+        "scrollbar": {"bg": bg_color},
+    }
+
+def style_widgets(role_widgets, options):
+    """Configure each (role, widget) pair with its role's options in a single call"""
+    for role, widget in role_widgets:
+        widget.configure(**options[role])
 
 def apply_theme():
-    bg_color = "#333" if settings["theme"] == "dark" else "#fff"
-    fg_color = "#fff" if settings["theme"] == "dark" else "#000"
+    bg_color, fg_color = theme_colors()
     
     style = ttk.Style()
     style.configure("TFrame", background=bg_color)
@@ -225,49 +463,13 @@ def apply_theme():
     
     root.configure(bg=bg_color)
     
-    # Update all frames and their children with the new theme
-    for tab_id in notebook.tabs():
-        tab = notebook.nametowidget(tab_id)
-        for widget in get_all_widgets(tab):
-            if isinstance(widget, tk.Frame) or isinstance(widget, ttk.Frame):
-                try:
-                    widget.configure(bg=bg_color)
-                except:
-                    pass  # Some ttk widgets might not have bg option
-            if hasattr(widget, 'configure'):
-                try:
-                    if 'fg' in widget.config():
-                        widget.configure(fg=fg_color)
-                    if 'bg' in widget.config() and not isinstance(widget, tk.Listbox):
-                        widget.configure(bg=bg_color)
-                except:
-                    pass  # Ignore widgets that don't have these configs
-    
-    # Update main UI elements
-    for widget in [theme_btn, color_btn, tab_entry, add_tab_btn, import_settings_btn, 
-                  import_tasks_btn, delete_tab_btn, hour_entry, minute_entry, reset_btn,
-                  top_frame, tab_frame, reset_frame, reset_all_btn]:
-        if widget and hasattr(widget, 'configure'):
-            try:
-                if 'bg' in widget.config():
-                    widget.configure(bg=bg_color)
-                if 'fg' in widget.config():
-                    widget.configure(fg=fg_color)
-            except:
-                pass  # Ignore if can't configure
-    
-    # Update any top-level frames
-    for widget in get_all_widgets(root):
-        if isinstance(widget, tk.Label):
-            try:
-                widget.configure(bg=bg_color, fg=fg_color)
-            except:
-                pass
-    
-    # Apply custom color to listboxes
-    apply_custom_color()
+    # Update every registered widget, including the custom color on listboxes
+    options = theme_options()
+    style_widgets(((role, widget) for role, widgets in widget_registry.items() for widget in widgets.values()),
+                  options)
 
 def pick_color():
+    from tkinter import colorchooser
     color_code = colorchooser.askcolor(title="Choose Background Color")[1]
     if color_code:
         settings["custom_color"] = color_code
@@ -276,13 +478,11 @@ def pick_color():
 
 def apply_custom_color():
     # Update all listboxes with the custom color
-    for tab_id in notebook.tabs():
-        tab = notebook.nametowidget(tab_id)
-        for widget in get_all_widgets(tab):
-            if isinstance(widget, tk.Listbox):
-                widget.config(bg=settings["custom_color"])
+    for listbox in widget_registry["listbox"].values():
+        listbox.config(bg=settings["custom_color"])
 
 def set_reset_time():
+    from tkinter import messagebox
     try:
         hour = int(hour_entry.get())
         minute = int(minute_entry.get())
@@ -291,143 +491,100 @@ def set_reset_time():
             settings["reset_hour"] = hour
             settings["reset_minute"] = minute
             save_settings()
+            reset_scheduler.reschedule()
             messagebox.showinfo("Success", "Reset time updated!")
         else:
             messagebox.showerror("Error", "Hours must be 0-23 and minutes 0-59.")
     except ValueError:
         messagebox.showerror("Error", "Enter valid numbers for hour and minute.")
 
+def show_reset_rule():
+    """Fill the rule box with the selected tab's reset rule"""
+    rule = store.reset_rule(notebook.tab(notebook.select(), "text"))
+    rule_entry.delete(0, tk.END)
+    rule_entry.insert(0, str(rule) if rule is not None else "never")
+
+def set_reset_rule():
+    from tkinter import messagebox
+    tab_name = notebook.tab(notebook.select(), "text")
+    try:
+        store.set_reset_rule(tab_name, rule_entry.get())
+    except ValueError as e:
+        messagebox.showerror("Error", f"Invalid reset rule: {e}")
+        return
+    next_reset = store.next_reset(tab_name)
+    show_reset_rule()
+    messagebox.showinfo("Success", f"{tab_name} now resets: {rule_entry.get()}"
+                        + (f" (next: {next_reset:%Y-%m-%d %H:%M})" if next_reset else ""))
+
 def reset_all_tasks():
+    from tkinter import messagebox
     if messagebox.askyesno("Confirm Reset", "Reset all tasks to uncompleted state?"):
         # Clear all task states
-        global task_states
-        task_states = {}
-        save_task_states()
+        store.reset_all()
         
         # Refresh all listboxes
-        for tab_id in notebook.tabs():
-            tab = notebook.nametowidget(tab_id)
-            for widget in get_all_widgets(tab):
-                if isinstance(widget, tk.Listbox):
-                    tab_name = notebook.tab(notebook.index(tab_id), "text")
-                    update_list(tab_name, widget)
-
-def reset_dailies():
-    """Reset daily tasks to their default state"""
-    if "Dailies" in tasks:
-        tasks["Dailies"] = daily_tasks.copy()
-        
-        # Reset completion states for daily tasks
-        for task in daily_tasks:
-            task_key = f"Dailies:{task}"
-            if task_key in task_states:
-                del task_states[task_key]
-        
-        save_tasks()
-        save_task_states()
-        
-        # Update the Dailies listbox if it exists
-        for tab_id in notebook.tabs():
-            tab_name = notebook.tab(notebook.index(tab_id), "text")
-            if tab_name == "Dailies":
-                tab = notebook.nametowidget(tab_id)
-                for widget in get_all_widgets(tab):
-                    if isinstance(widget, tk.Listbox):
-                        update_list("Dailies", widget)
-                        break
-                break
-
-def scheduled_reset():
-    """Handles daily, weekly, and monthly task resets"""
-    last_reset_day = datetime.now().day
-    last_reset_week = datetime.now().isocalendar()[1]  # ISO week number
-    last_reset_month = datetime.now().month
-    
-    while True:
-        now = datetime.now()
-        current_day = now.day
-        current_week = now.isocalendar()[1]
-        current_month = now.month
-        
-        # Check for daily reset time
-        if now.hour == settings["reset_hour"] and now.minute == settings["reset_minute"]:
-            if current_day != last_reset_day:
-                reset_dailies()
-                last_reset_day = current_day
-                
-                # Reset any tab marked as "Daily"
-                for tab_name in tasks.keys():
-                    if tab_name.lower().endswith("daily") or tab_name == "Dailies":
-                        # Clear completion states for this tab
-                        for key in list(task_states.keys()):
-                            if key.startswith(f"{tab_name}:"):
-                                del task_states[key]
-        
-        # Weekly reset (check if week number changed)
-        if current_week != last_reset_week:
-            for tab_name in tasks.keys():
-                if tab_name.lower().endswith("weekly"):
-                    # Clear completion states for weekly tabs
-                    for key in list(task_states.keys()):
-                        if key.startswith(f"{tab_name}:"):
-                            del task_states[key]
-            last_reset_week = current_week
-        
-        # Monthly reset (check if month changed)
-        if current_month != last_reset_month:
-            for tab_name in tasks.keys():
-                if tab_name.lower().endswith("monthly"):
-                    # Clear completion states for monthly tabs
-                    for key in list(task_states.keys()):
-                        if key.startswith(f"{tab_name}:"):
-                            del task_states[key]
-            last_reset_month = current_month
-        
-        # Save state changes if any resets occurred
-        save_task_states()
-        
-        # Sleep for a bit to prevent high CPU usage
-        time.sleep(30)
+        for tab_name in list(tab_widgets):
+            refresh_tab(tab_name)
+
+def show_stats():
+    """Completion rates and streaks for the current tab, from the completion history"""
+    from tkinter import messagebox
+    from kaizen_history import summary_lines
+    tab_name = notebook.tab(notebook.select(), "text")
+    lines = summary_lines(store.stats(), tab_name, len(tasks.get(tab_name, ())))
+    if len(lines) > STATS_MAX_LINES:
+        lines = lines[:STATS_MAX_LINES] + [f"... and {len(lines) - STATS_MAX_LINES} more tasks"]
+    messagebox.showinfo("Stats", "\n".join(lines))
+
+def start_reset_scheduler():
+    """Start the deadline-based reset scheduler, catching up on resets missed while closed"""
+    # Resets run on the scheduler's thread; the tabs they changed are redrawn on the Tk thread
+    scheduler = store.reset_scheduler(
+        lambda changed: [ui_updates.put(("refresh_tab", tab_name)) for tab_name in changed])
+    scheduler.start()
+    return scheduler
+
+# The tab being dragged to a new place, if any, and whether it has moved yet
+drag_state = {"frame": None, "moved": False}
+
+def tab_at(x, y):
+    """Index of the notebook tab under widget coordinates x, y, or None"""
+    try:
+        return notebook.index(f"@{x},{y}")
+    except tk.TclError:
+        return None
 
-def on_tab_reorder(event):
-    """Handle tab reordering via drag and drop"""
-    x, y = event.x_root, event.y_root
-    tab_idx = notebook.index("@%d,%d" % (x, y))
-    
-    if tab_idx >= 0:
-        # Get the currently selected tab
-        selected_tab = notebook.select()
-        selected_idx = notebook.index(selected_tab)
-        
-        if selected_idx != tab_idx:
-            # Get tab names
-            tab_name = notebook.tab(selected_idx, "text")
-            
-            # Update the tab order in settings
-            tab_order = settings["tab_order"]
-            if tab_name in tab_order:
-                tab_order.remove(tab_name)
-                tab_order.insert(tab_idx, tab_name)
-                settings["tab_order"] = tab_order
-                save_settings()
-            
-            # Actually reorder the tab in the notebook
-            notebook.forget(selected_idx)
-            create_tab(tab_name)
-            notebook.select(tab_idx)
+def on_tab_press(event):
+    """Start dragging the tab under the pointer"""
+    idx = tab_at(event.x, event.y)
+    drag_state["frame"] = notebook.tabs()[idx] if idx is not None else None
+    drag_state["moved"] = False
+
+def on_tab_drag(event):
+    """Move the dragged tab's frame to the slot under the pointer; nothing is rebuilt or saved"""
+    frame = drag_state["frame"]
+    idx = tab_at(event.x, event.y)
+    if frame is None or idx is None:
+        return
+    if notebook.index(frame) != idx:
+        notebook.insert(idx, frame)
+        drag_state["moved"] = True
+
+def on_tab_release(event):
+    """Save the new tab order once the drag is over"""
+    if drag_state["moved"]:
+        store.set_tab_order([notebook.tab(tab_id, "text") for tab_id in notebook.tabs()])
+    drag_state["frame"] = None
+    drag_state["moved"] = False
 
 def import_settings_from_file():
     """Import settings from a JSON file"""
+    from tkinter import messagebox
     new_settings = import_json("settings")
     if new_settings:
-        global settings
-        # Validate imported settings
-        for key in default_settings:
-            if key not in new_settings:
-                new_settings[key] = default_settings[key]
-        
-        settings = new_settings
-        save_settings()
+        # Missing keys get their defaults
+        store.replace_settings(new_settings)
         
         # Apply imported settings
         apply_theme()
@@ -442,29 +599,50 @@ def import_settings_from_file():
         
         messagebox.showinfo("Import Successful", "Settings imported successfully!")
 
+# An import writes its batches out early rather than queue more than this many operations
+IMPORT_MAX_PENDING = 20000
+
 def import_tasks_from_file():
-    """Import tasks from a JSON file"""
-    new_tasks = import_json("tasks")
-    if new_tasks:
-        global tasks
-        tasks = new_tasks
-        save_tasks()
-        
-        # Clear and recreate tabs
-        for tab_id in notebook.tabs():
-            notebook.forget(0)  # Remove all tabs
-        
-        # Update tab order if needed
-        if "tab_order" not in settings or not settings["tab_order"]:
-            settings["tab_order"] = list(tasks.keys())
-            save_settings()
-        
-        # Create tabs in the correct order
-        for tab_name in settings["tab_order"]:
-            if tab_name in tasks:
-                create_tab(tab_name)
-        
-        messagebox.showinfo("Import Successful", "Tasks imported successfully!")
+    """Merge tasks from a JSON, JSONL or CSV file, streamed on a worker thread"""
+    from tkinter import filedialog
+    from kaizen_import import StreamingImporter
+    file_path = filedialog.askopenfilename(
+        title="Import Tasks",
+        filetypes=[("Task files", "*.json *.jsonl *.ndjson *.csv"), ("All files", "*.*")]
+    )
+    if not file_path:
+        return
+    
+    import_tasks_btn.config(state=tk.DISABLED)
+    status_label.config(text="Importing...")
+    importer = StreamingImporter(
+        file_path, apply_import_batch,
+        on_progress=lambda report, fraction: ui_updates.put(
+            ("status", f"Importing... {fraction:.0%} ({report.added} tasks added)")))
+    importer.start(lambda report: ui_updates.put(("import_done", report)))
+
+def apply_import_batch(records, report):
+    """Merge one batch of imported records (runs on the importer thread)"""
+    ops = store.merge_import(records, report)
+    if writer.pending() >= IMPORT_MAX_PENDING:
+        writer.flush()
+    
+    # New tabs are added and touched tabs redrawn on the Tk thread
+    for op in ops:
+        if op["op"] == "add_tab":
+            ui_updates.put(("add_tab", op["tab"]))
+    for tab_name in {op["tab"] for op in ops}:
+        ui_updates.put(("refresh_tab", tab_name))
+
+def finish_import(report):
+    from tkinter import messagebox
+    import_tasks_btn.config(state=tk.NORMAL)
+    status_label.config(text=f"Imported {report.added} tasks")
+    root.after_idle(prefetch_tabs)
+    if report.failure:
+        messagebox.showerror("Import Failed", report.summary())
+    else:
+        messagebox.showinfo("Import Successful", report.summary())
 
 def auto_resize_window():
     """Resize window based on number of tasks"""
@@ -474,84 +652,142 @@ def auto_resize_window():
     width = max(600, min(800, 600 + (total_tasks * 5)))
     height = max(400, min(700, 400 + (total_tasks * 10)))
     
-    # Update settings
-    settings["window_width"] = width
-    settings["window_height"] = height
-    save_settings()
+    # Update settings only if the size actually changed
+    if (settings.get("window_width"), settings.get("window_height")) != (width, height):
+        settings["window_width"] = width
+        settings["window_height"] = height
+        save_settings()
     
     # Set the new window size
     root.geometry(f"{width}x{height}")
 
 # GUI Setup
-root = tk.Tk()
-root.title("Kaizen Task Manager")
+loading_label.destroy()
 root.geometry(f"{settings.get('window_width', 600)}x{settings.get('window_height', 400)}")
 
 # Main top frame for controls
-top_frame = tk.Frame(root)
+top_frame = register("frame", tk.Frame(root))
 top_frame.pack(fill=tk.X, pady=5)
 
-theme_btn = tk.Button(top_frame, text="Toggle Theme", command=toggle_theme)
+theme_btn = register("button", tk.Button(top_frame, text="Toggle Theme", command=toggle_theme))
 theme_btn.pack(side=tk.LEFT, padx=5)
 
-color_btn = tk.Button(top_frame, text="Choose Custom Color", command=pick_color)
+color_btn = register("button", tk.Button(top_frame, text="Choose Custom Color", command=pick_color))
 color_btn.pack(side=tk.LEFT, padx=5)
 
-import_settings_btn = tk.Button(top_frame, text="Import Settings", command=import_settings_from_file)
+import_settings_btn = register("button", tk.Button(top_frame, text="Import Settings", command=import_settings_from_file))
 import_settings_btn.pack(side=tk.LEFT, padx=5)
 
-import_tasks_btn = tk.Button(top_frame, text="Import Tasks", command=import_tasks_from_file)
+import_tasks_btn = register("button", tk.Button(top_frame, text="Import Tasks", command=import_tasks_from_file))
 import_tasks_btn.pack(side=tk.LEFT, padx=5)
 
-reset_all_btn = tk.Button(top_frame, text="Reset All Tasks", command=reset_all_tasks)
+stats_btn = register("button", tk.Button(top_frame, text="Stats", command=show_stats))
+stats_btn.pack(side=tk.LEFT, padx=5)
+
+undo_btn = register("button", tk.Button(top_frame, text="Undo", command=undo))
+undo_btn.pack(side=tk.LEFT, padx=5)
+
+redo_btn = register("button", tk.Button(top_frame, text="Redo", command=redo))
+redo_btn.pack(side=tk.LEFT, padx=5)
+
+root.bind("<Control-z>", undo)
+root.bind("<Control-y>", redo)
+root.bind("<Control-Z>", redo)
+
+reset_all_btn = register("button", tk.Button(top_frame, text="Reset All Tasks", command=reset_all_tasks))
 reset_all_btn.pack(side=tk.RIGHT, padx=5)
 
-delete_tab_btn = tk.Button(top_frame, text="Delete Current Tab", command=delete_tab)
+delete_tab_btn = register("button", tk.Button(top_frame, text="Delete Current Tab", command=delete_tab))
 delete_tab_btn.pack(side=tk.RIGHT, padx=5)
 
+# Search as you type filters the current tab; Enter jumps to the next tab with matches
+search_frame = register("frame", tk.Frame(root))
+search_frame.pack(fill=tk.X)
+
+register("label", tk.Label(search_frame, text="Search")).pack(side=tk.LEFT, padx=5)
+
+search_entry = register("entry", tk.Entry(search_frame, width=30))
+search_entry.pack(side=tk.LEFT)
+search_entry.bind("<KeyRelease>", apply_search)
+search_entry.bind("<Return>", search_next_tab)
+
+search_next_btn = register("button", tk.Button(search_frame, text="Next Tab", command=search_next_tab))
+search_next_btn.pack(side=tk.LEFT, padx=5)
+
+search_label = register("label", tk.Label(search_frame, text=""))
+search_label.pack(side=tk.LEFT, padx=5)
+
 # Create notebook and tabs
 notebook = ttk.Notebook(root)
 notebook.pack(expand=True, fill="both")
 
 # Enable tab reordering with mouse drag
-notebook.bind("<B1-Motion>", on_tab_reorder)
+notebook.bind("<ButtonPress-1>", on_tab_press, add="+")
+notebook.bind("<B1-Motion>", on_tab_drag)
+notebook.bind("<ButtonRelease-1>", on_tab_release, add="+")
+
+# Tabs are built lazily, the first time they are shown
+notebook.bind("<<NotebookTabChanged>>", on_tab_changed)
 
 # Tab creation controls
-tab_frame = tk.Frame(root)
+tab_frame = register("frame", tk.Frame(root))
 tab_frame.pack(fill=tk.X, pady=5)
 
-tab_entry = tk.Entry(tab_frame, width=20)
+tab_entry = register("entry", tk.Entry(tab_frame, width=20))
 tab_entry.pack(side=tk.LEFT, padx=5)
 
-add_tab_btn = tk.Button(tab_frame, text="Add Tab", command=add_tab)
+add_tab_btn = register("button", tk.Button(tab_frame, text="Add Tab", command=add_tab))
 add_tab_btn.pack(side=tk.LEFT)
 
+# Progress of background work such as imports
+status_label = register("label", tk.Label(tab_frame, text=""))
+status_label.pack(side=tk.RIGHT, padx=5)
+
 # Reset time UI
-reset_frame = tk.Frame(root)
+reset_frame = register("frame", tk.Frame(root))
 reset_frame.pack(pady=5, fill=tk.X)
 
-tk.Label(reset_frame, text="Daily Reset Time (HH:MM)").pack(side=tk.LEFT, padx=5)
+register("label", tk.Label(reset_frame, text="Daily Reset Time (HH:MM)")).pack(side=tk.LEFT, padx=5)
 
-hour_entry = tk.Entry(reset_frame, width=3)
+hour_entry = register("entry", tk.Entry(reset_frame, width=3))
 hour_entry.insert(0, str(settings["reset_hour"]))
 hour_entry.pack(side=tk.LEFT)
 
-tk.Label(reset_frame, text=":").pack(side=tk.LEFT)
+register("label", tk.Label(reset_frame, text=":")).pack(side=tk.LEFT)
 
-minute_entry = tk.Entry(reset_frame, width=3)
+minute_entry = register("entry", tk.Entry(reset_frame, width=3))
 minute_entry.insert(0, str(settings["reset_minute"]))
 minute_entry.pack(side=tk.LEFT)
 
-reset_btn = tk.Button(reset_frame, text="Set Time", command=set_reset_time)
+reset_btn = register("button", tk.Button(reset_frame, text="Set Time", command=set_reset_time))
 reset_btn.pack(side=tk.LEFT, padx=5)
 
-# Create tabs based on tab_order setting
+# Each tab's own reset rule, e.g. "weekly mon,thu 07:00", "every 3 days" or "cron 0 6 * * 1-5"
+set_rule_btn = register("button", tk.Button(reset_frame, text="Set Rule", command=set_reset_rule))
+set_rule_btn.pack(side=tk.RIGHT, padx=5)
+
+rule_entry = register("entry", tk.Entry(reset_frame, width=24))
+rule_entry.pack(side=tk.RIGHT)
+
+register("label", tk.Label(reset_frame, text="Tab Reset Rule")).pack(side=tk.RIGHT, padx=5)
+
+# Create tabs based on tab_order setting; only the selected one is built up front
 for tab_name in settings["tab_order"]:
     if tab_name in tasks:
         create_tab(tab_name)
+on_tab_changed(None)
+
+# Apply theme (which includes the custom color)
+apply_theme()
+mark_startup("window built")
+
+# Show the tasks before starting anything that can wait
+root.update()
+mark_startup("tasks shown")
 
-# Start reset thread
-threading.Thread(target=scheduled_reset, daemon=True).start()
+# Start reset scheduler and the loop that applies its changes to the UI
+reset_scheduler = start_reset_scheduler()
+root.after(UI_DRAIN_INTERVAL, drain_ui_updates)
 
 # Auto-resize based on task count every 2 minutes
 def resize_timer():
@@ -560,8 +796,42 @@ def resize_timer():
 
 root.after(1000, resize_timer)  # Start after 1 second
 
-# Apply theme and custom color
-apply_theme()
-apply_custom_color()
+# Build the remaining tabs in idle time once the window is up
+root.after(PREFETCH_DELAY, lambda: root.after_idle(prefetch_tabs))
+mark_startup("background started")
+
+def on_close():
+    """Flush the storage backend before exiting; if saving fails, offer to retry or close without it"""
+    reset_scheduler.stop()
+    while True:
+        try:
+            store.close()
+            break
+        except Exception as e:
+            from tkinter import messagebox
+            if not messagebox.askretrycancel(
+                    "Save Failed", f"Your latest changes could not be saved:\n{e}\n\n"
+                                   "Retry, or Cancel to close without them."):
+                break
+    root.destroy()
+
+def startup_report():
+    """Print the startup phases and whether the window was usable within STARTUP_BUDGET_MS"""
+    previous = 0
+    for phase, ms in startup_marks:
+        print(f"{phase:<20} {ms:8.1f} ms  (+{ms - previous:.1f})")
+        previous = ms
+    # The "Loading..." window comes up quickly whatever the store; what counts is when the tasks show
+    tasks_shown = dict(startup_marks)["tasks shown"]
+    within = tasks_shown <= STARTUP_BUDGET_MS
+    print(f"Tasks shown after {tasks_shown:.0f} ms, budget {STARTUP_BUDGET_MS} ms: {'ok' if within else 'OVER BUDGET'}")
+    return within
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+
+if "--startup-report" in sys.argv[1:]:
+    within_budget = startup_report()
+    on_close()
+    sys.exit(0 if within_budget else 1)
 
 root.mainloop()
\ No newline at end of file